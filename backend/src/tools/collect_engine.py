@@ -0,0 +1,274 @@
+"""
+collect_engine.py — DART 재무제표 동시 수집 엔진 (토큰 버킷 속도 제한, 재시도, 체크포인트, 요약 리포트)
+
+[역할]
+  mass_collect_financials는 한 기업씩 time.sleep(0.3)을 두고 CFS → OFS를 차례로 호출하며,
+  오류는 print 후 버려서 수천 개 상장사 수집에 몇 시간이 걸리고 무엇이 실패했는지 남지 않았다.
+  - 워커 풀: 여러 기업을 동시에 조회 (workers)
+  - 토큰 버킷: 모든 워커가 공유하는 초당 호출 수 상한 (OpenDART 분당 한도에 맞춤) + 하루 호출 수 상한
+  - 재시도: 일시적 오류(요청 한도 초과 020, 점검 800, 네트워크/5xx)는 지수 백오프 + full jitter
+      인증키 오류(010/011/012/901)는 즉시 전체 중단, 재시도해도 020이 계속되면(하루 한도 소진) 전체 중단,
+      그 외 오류는 해당 기업만 failed
+  - OpenDartClient: OpenDartReader.finstate_all은 오류 status(020, 010 등)에도 예외 없이 빈 DataFrame을
+      돌려줘서 '데이터 없음'과 구분되지 않는다. 엔드포인트를 직접 호출해 status를 보고,
+      013(조회된 데이터 없음)만 None, 나머지 오류는 DartStatusError로 올림
+      → 매니페스트의 empty(다음 실행에서 건너뜀)는 실제로 데이터가 없는 기업에만 기록됨
+  - 체크포인트: Parquet 저장소 매니페스트에 done / empty / failed 기록 (failed는 다음 실행에서 다시 시도)
+  - 요약 리포트: 상태별 건수, 호출/재시도 수, 소요 시간, 실패 기업과 오류 (콘솔 + JSON)
+
+  저장소(ParquetStatementStore)는 스레드 안전하지 않으므로 워커는 조회만 하고,
+  저장/체크포인트 기록은 메인 스레드에서 완료 순서대로 처리한다.
+
+[주요 클래스/함수]
+  - TokenBucket(rate, capacity): acquire() — 토큰이 생길 때까지 대기
+  - CollectEngine(client, store, workers, rate, burst, ...): run(corps, year) → 요약 dict
+      client: finstate_all(corp_code, bsns_year, reprt_code=, fs_div=) 을 가진 객체 (OpenDartClient 또는 가짜)
+              데이터 없음은 None/빈 DataFrame, API 오류는 예외로 알려야 함
+  - OpenDartClient(api_key, timeout): finstate_all(...) / finstate(...) → DataFrame / None(013) / DartStatusError
+  - classify_error(e): "retry" | "fatal" | "fail"
+
+[참조하는 곳]
+  - fetch_financials.py → mass_collect_financials, get_refined_financials (OpenDartClient.finstate)
+"""
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+# OpenDART 응답 상태 코드 (오류 메시지에 포함되어 전달됨)
+RETRYABLE_STATUS = ('020', '800', '900')        # 요청 제한 초과 / 시스템 점검 / 정의되지 않은 오류
+FATAL_STATUS = ('010', '011', '012', '901')     # 등록되지 않은 키 / 사용할 수 없는 키 / 접근 불가 IP / 키 만료
+
+NO_DATA_STATUS = '013'                          # 조회된 데이터가 없음
+RATE_LIMIT_STATUS = '020'
+
+FINSTATE_ALL_URL = 'https://opendart.fss.or.kr/api/fnlttSinglAcntAll.json'
+FINSTATE_URL = 'https://opendart.fss.or.kr/api/fnlttSinglAcnt.json'
+
+# 기본 조회 순서: 연결(CFS) 3분기 → 없으면 별도(OFS) 사업보고서 (기존 수집 로직과 동일)
+DEFAULT_ATTEMPTS = (('11014', 'CFS'), ('11011', 'OFS'))
+
+
+class FatalCollectError(Exception):
+    pass
+
+
+class DartStatusError(Exception):
+    """OpenDART 응답 status가 정상(000)/데이터 없음(013)이 아님"""
+
+    def __init__(self, status, message=""):
+        super().__init__(f"status '{status}': {message}")
+        self.status = status
+        self.message = message
+
+
+class OpenDartClient:
+    """단일회사 (전체) 재무제표(fnlttSinglAcntAll / fnlttSinglAcnt) 조회. OpenDartReader와 달리 응답 status를 검사"""
+
+    def __init__(self, api_key, timeout=30):
+        import requests
+
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()   # 워커들이 연결 재사용 (요청 단위 호출만 하므로 스레드 간 공유 가능)
+
+    def finstate_all(self, corp_code, bsns_year, reprt_code='11011', fs_div='CFS'):
+        return self._get(FINSTATE_ALL_URL, {'corp_code': corp_code, 'bsns_year': str(bsns_year),
+                                            'reprt_code': reprt_code, 'fs_div': fs_div})
+
+    def finstate(self, corp_code, bsns_year, reprt_code='11011'):
+        """주요 계정 재무정보 (OpenDartReader.finstate와 같은 열)"""
+        return self._get(FINSTATE_URL, {'corp_code': corp_code, 'bsns_year': str(bsns_year), 'reprt_code': reprt_code})
+
+    def _get(self, url, params):
+        r = self.session.get(url, params={'crtfc_key': self.api_key, **params}, timeout=self.timeout)
+        r.raise_for_status()   # HTTPError(response.status_code) → classify_error가 429/5xx 재시도
+        jo = r.json()
+        status = str(jo.get('status', ''))
+        if status == '000':
+            return pd.DataFrame(jo.get('list') or [])
+        if status == NO_DATA_STATUS:
+            return None
+        raise DartStatusError(status, jo.get('message', ''))
+
+
+def classify_error(e):
+    """예외 → "retry"(일시적) / "fatal"(전체 중단) / "fail"(해당 기업만 실패)"""
+    status = getattr(e, "status", None)
+    if isinstance(status, str):
+        if status in FATAL_STATUS:
+            return "fatal"
+        return "retry" if status in RETRYABLE_STATUS else "fail"
+    message = str(e)
+    if any(f"'{code}'" in message or f'"{code}"' in message for code in FATAL_STATUS):
+        return "fatal"
+    if any(f"'{code}'" in message or f'"{code}"' in message for code in RETRYABLE_STATUS):
+        return "retry"
+    name = type(e).__name__
+    if name in ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "ChunkedEncodingError", "TimeoutError"):
+        return "retry"
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None and (status == 429 or status >= 500):
+        return "retry"
+    return "fail"
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CollectEngine:
+    def __init__(self, client, store, workers=4, rate=8.0, burst=None, daily_limit=20_000, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, attempts=DEFAULT_ATTEMPTS, report_path=None):
+        self.client = client
+        self.store = store
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.daily_limit = daily_limit
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = attempts
+        self.report_path = report_path
+        self.counters = {"calls": 0, "retries": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.abort_reason = None
+
+    def _abort(self, reason):
+        """남은 조회를 모두 멈춤 (첫 번째 사유를 리포트에 남김)"""
+        with self._lock:
+            self.abort_reason = self.abort_reason or reason
+        self._stop.set()
+        return FatalCollectError(reason)
+
+    # --- [워커: 조회만] ---
+
+    def _call(self, corp_code, year, reprt_code, fs_div):
+        for attempt in range(self.max_retries + 1):
+            if self._stop.is_set():
+                raise FatalCollectError("수집 중단됨")
+            with self._lock:
+                limit_reached = bool(self.daily_limit) and self.counters["calls"] >= self.daily_limit
+                if not limit_reached:
+                    self.counters["calls"] += 1
+            if limit_reached:
+                raise self._abort(f"하루 호출 한도 도달 ({self.daily_limit:,}회)")
+            self.bucket.acquire()
+            try:
+                return self.client.finstate_all(corp_code, year, reprt_code=reprt_code, fs_div=fs_div)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == "fatal":
+                    raise self._abort(f"{type(e).__name__}: {e}") from e
+                if kind == "retry" and attempt == self.max_retries and getattr(e, "status", None) == RATE_LIMIT_STATUS:
+                    # 백오프 후에도 계속 한도 초과 → 하루 한도 소진. 남은 기업을 failed로 태우지 않고 중단
+                    raise self._abort(f"OpenDART 요청 한도 초과(020)가 계속됨: {e}") from e
+                if kind == "fail" or attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.counters["retries"] += 1
+                # 지수 백오프 + full jitter (여러 워커가 동시에 재시도하지 않도록). 중단되면 바로 깨어남
+                self._stop.wait(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def _collect_one(self, corp_code, year):
+        """→ ("done", DataFrame) / ("empty", None)"""
+        for reprt_code, fs_div in self.attempts:
+            fs = self._call(corp_code, year, reprt_code, fs_div)
+            if fs is not None and not (isinstance(fs, pd.DataFrame) and fs.empty):
+                return "done", fs
+        return "empty", None
+
+    # --- [메인 스레드: 저장 / 체크포인트 / 리포트] ---
+
+    def run(self, corps, year):
+        """corps: [(corp_code, corp_name)]. 저장소에 done/empty로 기록된 기업은 건너뜀"""
+        start = time.perf_counter()
+        todo = [(str(code).zfill(8), name) for code, name in corps if not self.store.is_done(year, code)]
+        summary = {"year": str(year), "total": len(corps), "skipped": len(corps) - len(todo),
+                   "done": 0, "empty": 0, "failed": 0, "not_run": 0, "failures": {}, "aborted": None}
+        print(f"🚀 수집 시작: {len(todo)}개 기업 (이미 완료 {summary['skipped']}개), 워커 {self.workers}, "
+              f"초당 {self.bucket.rate:g}회")
+
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dart")
+        try:
+            with self.store:
+                self._drain(pool, todo, year, summary)
+        except BaseException:
+            # Ctrl+C 등으로 메인 루프가 끝나면 대기열의 기업은 조회하지 않음 (결과를 버릴 호출로 한도를 쓰지 않도록)
+            self._abort("메인 루프 중단")
+            raise
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        summary.update(self.counters)
+        summary["aborted"] = self.abort_reason
+        summary["elapsed_s"] = round(time.perf_counter() - start, 2)
+        summary["calls_per_sec"] = round(summary["calls"] / summary["elapsed_s"], 2) if summary["elapsed_s"] else 0.0
+        self._report(summary)
+        return summary
+
+    def _drain(self, pool, todo, year, summary):
+        """워커 결과를 완료 순서대로 저장소에 기록"""
+        futures = {pool.submit(self._collect_one, code, year): (code, name) for code, name in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            code, name = futures[future]
+            try:
+                status, fs = future.result()
+            except FatalCollectError:
+                # 중단 이후 시작도 못 한 기업은 기록하지 않음 (다음 실행에서 이어서)
+                summary["not_run"] += 1
+                continue
+            except Exception as e:
+                summary["failed"] += 1
+                summary["failures"][code] = f"{name}: {type(e).__name__}: {e}"[:300]
+                self.store.mark(year, code, status="failed")
+                print(f"[{i}/{len(todo)}] {name} ❌ 에러: {e}")
+                continue
+
+            if status == "done":
+                fs['corp_name_origin'] = name
+                self.store.append(fs, year, corp_code=code)
+                print(f"[{i}/{len(todo)}] {name} ✅")
+            else:
+                self.store.mark(year, code, status="empty")
+                print(f"[{i}/{len(todo)}] {name} ⚠️ 데이터 없음 (Skip)")
+            summary[status] += 1
+
+    def _report(self, summary):
+        print("-" * 50)
+        print(f"📊 {summary['year']}년 수집 요약: 완료 {summary['done']} | 데이터 없음 {summary['empty']} | "
+              f"실패 {summary['failed']} | 건너뜀 {summary['skipped']} | 미실행 {summary['not_run']}")
+        print(f"   호출 {summary['calls']:,}회 (재시도 {summary['retries']:,}회), "
+              f"{summary['elapsed_s']}s, 초당 {summary['calls_per_sec']}회")
+        if summary["aborted"]:
+            print(f"🛑 중단 사유: {summary['aborted']}")
+        for code, error in list(summary["failures"].items())[:10]:
+            print(f"   ❌ {code} {error}")
+        if self.report_path:
+            os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+            with open(self.report_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            print(f"📍 리포트: {os.path.abspath(self.report_path)}")
+        print("-" * 50)
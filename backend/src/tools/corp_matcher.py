@@ -0,0 +1,195 @@
+"""
+corp_matcher.py — 질문 속 기업명 로컬 매칭 (Aho-Corasick 오토마톤 + 퍼지 보정)
+
+[역할]
+  dart_langgraph의 company_extractor_node는 질문에서 기업명 하나를 뽑으려고 매번 Gemini를 호출하고,
+  응답을 정규식으로 다듬었다. corp_list.csv(dart_collector.save_refined_corp_list 결과)로
+  오토마톤을 한 번 만들어 두고 로컬에서 찾는다 (질문 길이에 비례하는 한 번의 스캔).
+  - 사전: 기업명 / 공백·'(주)'를 뺀 정규화 이름 / 약칭(aliases) / 종목코드 → 기업
+  - 최장 일치: 'HD현대중공업' 안의 '현대중공업', 'LG에너지솔루션' 안의 'LG'는 따로 잡지 않음
+      영문/숫자로 시작·끝나는 용어는 앞뒤가 영문/숫자가 아닐 때만 인정 ('2005930' 안의 '005930' 제외)
+      두 글자 이하 한글 용어('대상', '기아')는 어절 전체일 때만 인정 (뒤에 조사는 허용, '평가대상' 제외)
+  - 퍼지 보정: 정확히 일치하는 용어가 없을 때만, 질문의 어절(및 붙여 쓴 인접 어절)을
+      difflib으로 정규화 이름(3글자 이상)과 비교 ('삼성 전자', '삼성전자의', '카카우뱅크')
+
+[주요 클래스/함수]
+  - CorpMatcher(entries, aliases, fuzzy_cutoff)
+      find_all(text) → [{corp_name, corp_code, stock_code, matched, start, end, method}] (등장 순서)
+      match(text) → 가장 긴 일치 1건 (없으면 퍼지 보정 결과 또는 None)
+          일치한 용어가 두 글자 이하면 퍼지 보정도 돌려 더 긴 기업명이 잡히면 그쪽으로
+          ('평가 대상이 뭐야? 삼성 전자 매출' → 대상이 아니라 삼성전자)
+  - CorpMatcher.from_csv(path, aliases)
+
+[참조하는 곳]
+  - models/dart_langgraph.py → company_extractor_node (매칭 실패 시에만 Gemini 호출)
+"""
+import re
+import difflib
+from collections import deque
+
+import pandas as pd
+
+from dart_cache import DEFAULT_CORP_LIST, CorpCodeIndex
+
+_ASCII_ALNUM = re.compile(r'[0-9a-z]')
+_TOKEN = re.compile(r'[^\s,.?!·/()\[\]"\']+')
+_HANGUL = re.compile(r'[가-힣]')
+
+# 짧은 한글 기업명 뒤에 붙어도 같은 어절로 보는 조사
+PARTICLES = {'은', '는', '이', '가', '을', '를', '의', '에', '와', '과', '도', '만', '로', '으로', '랑', '이랑',
+             '하고', '에서', '에게', '한테', '까지', '부터', '보다', '처럼', '께서', '이나', '나', '이요', '요'}
+SHORT_TERM = 2
+
+
+class CorpMatcher:
+    def __init__(self, entries, aliases=None, fuzzy_cutoff=0.8):
+        """
+        entries: [(corp_name, corp_code, stock_code)]
+        aliases: {약칭: 정식 기업명} (정식 기업명이 entries에 없으면 무시)
+        """
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.corps = []               # [(corp_name, corp_code, stock_code)]
+        self._by_normalized = {}      # 정규화 이름 → corps 위치
+        terms = {}                    # 소문자 용어 → corps 위치 (먼저 등록된 것 우선)
+
+        for name, code, stock_code in entries:
+            if not name or name != name:   # NaN 제외
+                continue
+            stock_code = str(stock_code).zfill(6) if stock_code and stock_code == stock_code else None
+            idx = len(self.corps)
+            self.corps.append((str(name), str(code).zfill(8), stock_code))
+            normalized = CorpCodeIndex.normalize(name)
+            self._by_normalized.setdefault(normalized, idx)
+            for term in (str(name).lower(), normalized, stock_code):
+                if term:
+                    terms.setdefault(term, idx)
+
+        for alias, name in (aliases or {}).items():
+            idx = self._by_normalized.get(CorpCodeIndex.normalize(name))
+            if idx is not None:
+                terms.setdefault(str(alias).lower(), idx)
+                terms.setdefault(CorpCodeIndex.normalize(alias), idx)
+
+        self._build(terms)
+        # 두 글자 이하 이름('LG', '기아')은 한 글자 차이도 다른 단어가 되므로 정확히 일치할 때만
+        self._fuzzy_names = [n for n in self._by_normalized if len(n) >= 3]
+
+    # --- [오토마톤 구축] ---
+
+    def _build(self, terms):
+        """트라이(goto) → BFS로 실패 링크와 출력 링크 연결"""
+        self._goto = [{}]
+        self._fail = [0]
+        self._term = [None]   # 노드에서 끝나는 용어 (길이, corps 위치)
+        self._out = [0]       # 실패 링크를 따라가며 만나는, 용어가 끝나는 가장 가까운 노드 (0이면 없음)
+
+        for term, idx in terms.items():
+            node = 0
+            for ch in term:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._term.append(None)
+                    self._out.append(0)
+                node = nxt
+            self._term[node] = (len(term), idx)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[child] = fail
+                self._out[child] = fail if self._term[fail] else self._out[fail]
+                queue.append(child)
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_CORP_LIST, aliases=None, **kwargs):
+        df = pd.read_csv(path, dtype=str, encoding='utf-8-sig')
+        stock_codes = df['stock_code'] if 'stock_code' in df else [None] * len(df)
+        return cls(zip(df['corp_name'], df['corp_code'], stock_codes), aliases=aliases, **kwargs)
+
+    def __len__(self):
+        return len(self.corps)
+
+    # --- [매칭] ---
+
+    def _result(self, idx, text, start, end, method):
+        name, code, stock_code = self.corps[idx]
+        return {"corp_name": name, "corp_code": code, "stock_code": stock_code,
+                "matched": text[start:end], "start": start, "end": end, "method": method}
+
+    @staticmethod
+    def _bounded(text, start, end):
+        """영문/숫자 용어가 더 긴 영문/숫자 단어의 일부가 아닌지, 짧은 한글 용어가 어절 전체(+조사)인지"""
+        if _ASCII_ALNUM.match(text[start]) and start > 0 and _ASCII_ALNUM.match(text[start - 1]):
+            return False
+        if _ASCII_ALNUM.match(text[end - 1]) and end < len(text) and _ASCII_ALNUM.match(text[end]):
+            return False
+        if end - start <= SHORT_TERM and _HANGUL.search(text[start:end]):
+            if start > 0 and _TOKEN.match(text[start - 1]):
+                return False
+            suffix = _TOKEN.match(text, end)
+            if suffix and suffix.group() not in PARTICLES:
+                return False
+        return True
+
+    def find_all(self, text):
+        """질문 속 기업을 최장 일치·겹침 없이 등장 순서로 (같은 기업은 한 번만)"""
+        lowered = str(text).lower()
+        candidates = []   # (시작, -길이, corps 위치)
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            hit = node if self._term[node] else self._out[node]
+            while hit:
+                length, idx = self._term[hit]
+                start = i + 1 - length
+                if self._bounded(lowered, start, i + 1):
+                    candidates.append((start, -length, idx))
+                hit = self._out[hit]
+
+        found, seen, taken_until = [], set(), 0
+        for start, neg_length, idx in sorted(candidates):
+            if start < taken_until:
+                continue
+            taken_until = start - neg_length
+            if idx not in seen:
+                seen.add(idx)
+                found.append(self._result(idx, text, start, taken_until, "exact"))
+        return found
+
+    def fuzzy(self, text):
+        """어절(및 인접 두 어절을 붙인 것) 중 정규화 이름과 가장 비슷한 기업 (cutoff 미만이면 None)"""
+        tokens = [(m.start(), m.end()) for m in _TOKEN.finditer(str(text))]
+        spans = tokens + [(a[0], b[1]) for a, b in zip(tokens, tokens[1:])]
+        best = None
+        for start, end in spans:
+            query = CorpCodeIndex.normalize(text[start:end])
+            if len(query) < 3:
+                continue
+            for name in difflib.get_close_matches(query, self._fuzzy_names, n=1, cutoff=self.fuzzy_cutoff):
+                score = difflib.SequenceMatcher(None, query, name).ratio()
+                if best is None or score > best[0]:
+                    best = (score, self._by_normalized[name], start, end)
+        return self._result(best[1], text, best[2], best[3], "fuzzy") if best else None
+
+    def match(self, text):
+        """대표 기업 1건: 정확히 일치한 것 중 가장 긴 용어 (같으면 먼저 나온 것) → 없으면 퍼지 보정"""
+        found = self.find_all(text)
+        best = max(found, key=lambda r: (r["end"] - r["start"], -r["start"])) if found else None
+        if not self.fuzzy_cutoff or (best and best["end"] - best["start"] > SHORT_TERM):
+            return best
+        # 짧은 이름은 일반 단어('대상', '한솔')와 겹치기 쉬움 → 띄어 쓴 더 긴 기업명이 있으면 그쪽
+        fuzzy = self.fuzzy(text)
+        if fuzzy and (best is None or len(CorpCodeIndex.normalize(fuzzy["corp_name"])) > best["end"] - best["start"]):
+            return fuzzy
+        return best
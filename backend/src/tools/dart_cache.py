@@ -0,0 +1,161 @@
+"""
+dart_cache.py — DART 응답 디스크 캐시(SQLite) + 기업명 → corp_code 메모리 색인
+
+[역할]
+  get_refined_financials는 질문마다 dart.find_corp_code(기업 목록 조회)와 dart.finstate를 네트워크로 호출해서,
+  1초 전에 물어본 같은 기업·연도도 다시 받아왔다.
+  - DartResponseCache: (API, corp_code, 연도, 보고서 코드, fs_div) → 응답 DataFrame
+      SQLite 파일에 저장 (프로세스 재시작 후에도 유지) + 최근 항목 메모리 LRU (반복 조회는 디스크도 안 읽음)
+      TTL은 회계 기간이 닫혔는지(해당 보고서 제출 기한이 지났는지)에 따라 다름
+        - 닫힌 기간: 값이 거의 바뀌지 않으므로 길게 (기본 30일, 정정공시 반영용)
+        - 열린 기간: 공시가 새로 올라올 수 있으므로 짧게 (기본 6시간)
+        - 데이터 없음(None/빈 응답): 짧게 (기본 1시간)
+  - CorpCodeIndex: corp_list.csv(dart_collector.save_refined_corp_list 결과)를 한 번 읽어
+      기업명 / 공백·'(주)' 등을 뺀 정규화 이름 / 종목코드 → corp_code 사전
+
+[주요 클래스/함수]
+  - DartResponseCache(path, closed_ttl, open_ttl, empty_ttl, memory_size)
+      get_or_fetch(api, corp_code, year, reprt_code, fs_div, fetch) / ttl_for(year, reprt_code) / stats()
+  - CorpCodeIndex.from_csv(path): lookup(name) → corp_code 또는 None
+  - is_period_closed(year, reprt_code, today)
+
+[참조하는 곳]
+  - fetch_financials.py → get_refined_financials
+"""
+import io
+import os
+import re
+import time
+import sqlite3
+import datetime
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# models/에서 import되어도 같은 파일을 쓰도록 이 파일 위치 기준 (backend/data/...)
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+DEFAULT_CACHE_PATH = os.path.join(_DATA_DIR, 'cache', 'dart_responses.sqlite')
+DEFAULT_CORP_LIST = os.path.join(_DATA_DIR, 'raw', 'corp_list.csv')
+
+# 보고서 코드 → 제출 기한 (연도 오프셋, 월, 일). 기한이 지나면 해당 기간은 닫힌 것으로 봄
+REPORT_DEADLINES = {
+    '11013': (0, 5, 15),    # 1분기보고서
+    '11012': (0, 8, 14),    # 반기보고서
+    '11014': (0, 11, 14),   # 3분기보고서
+    '11011': (1, 3, 31),    # 사업보고서 (다음 해 3월 말)
+}
+
+
+def is_period_closed(year, reprt_code, today=None):
+    today = today or datetime.date.today()
+    offset, month, day = REPORT_DEADLINES.get(str(reprt_code), (1, 3, 31))
+    return today > datetime.date(int(year) + offset, month, day)
+
+
+class DartResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, closed_ttl=30 * 86400, open_ttl=6 * 3600, empty_ttl=3600,
+                 memory_size=1024):
+        self.path = path
+        self.closed_ttl = closed_ttl
+        self.open_ttl = open_ttl
+        self.empty_ttl = empty_ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()   # key → (만료 시각, DataFrame 또는 None)
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " api TEXT, corp_code TEXT, year TEXT, reprt_code TEXT, fs_div TEXT,"
+            " payload TEXT, expires_at REAL, fetched_at REAL,"
+            " PRIMARY KEY (api, corp_code, year, reprt_code, fs_div))"
+        )
+        self._db.commit()
+
+    def ttl_for(self, year, reprt_code, empty=False):
+        if empty:
+            return self.empty_ttl
+        return self.closed_ttl if is_period_closed(year, reprt_code) else self.open_ttl
+
+    def stats(self):
+        return {"memory_entries": len(self._memory), **self.counters}
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_or_fetch(self, api, corp_code, year, reprt_code, fs_div, fetch):
+        """캐시에 유효한 응답이 있으면 반환, 없으면 fetch() 결과를 저장 후 반환 (DataFrame 또는 None)"""
+        key = (api, str(corp_code), str(year), str(reprt_code), str(fs_div))
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and hit[0] > now:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return hit[1]
+
+            row = self._db.execute(
+                "SELECT payload, expires_at FROM responses"
+                " WHERE api=? AND corp_code=? AND year=? AND reprt_code=? AND fs_div=?", key).fetchone()
+            if row and row[1] > now:
+                value = None if row[0] is None else pd.read_json(io.StringIO(row[0]), orient="split", dtype=False)
+                self._remember(key, row[1], value)
+                self.counters["disk_hits"] += 1
+                return value
+            self.counters["misses"] += 1
+
+        # 네트워크 호출은 잠금 밖에서
+        value = fetch()
+        if isinstance(value, pd.DataFrame) and value.empty:
+            value = None
+        expires_at = now + self.ttl_for(year, reprt_code, empty=value is None)
+        payload = None if value is None else value.to_json(orient="split", force_ascii=False)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             key + (payload, expires_at, now))
+            self._db.commit()
+            self._remember(key, expires_at, value)
+        return value
+
+    def purge_expired(self):
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._db.commit()
+        return deleted
+
+
+class CorpCodeIndex:
+    def __init__(self, entries):
+        """entries: [(corp_name, corp_code, stock_code)]"""
+        self._index = {}
+        for name, code, stock_code in entries:
+            code = str(code).zfill(8)
+            for term in (name, self.normalize(name), stock_code):
+                if term and term == term:   # NaN 제외
+                    self._index.setdefault(str(term), code)
+
+    @staticmethod
+    def normalize(name):
+        """'(주)', '주식회사', 공백 제거 + 영문 소문자 ('삼성 전자(주)' → '삼성전자')"""
+        name = re.sub(r'\(주\)|㈜|주식회사', '', str(name))
+        return re.sub(r'\s+', '', name).lower()
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_CORP_LIST):
+        df = pd.read_csv(path, dtype=str, encoding='utf-8-sig')
+        stock_codes = df['stock_code'] if 'stock_code' in df else [None] * len(df)
+        return cls(zip(df['corp_name'], df['corp_code'], stock_codes))
+
+    def __len__(self):
+        return len(self._index)
+
+    def lookup(self, name):
+        name = str(name).strip()
+        return self._index.get(name) or self._index.get(self.normalize(name))
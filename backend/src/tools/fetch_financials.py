@@ -7,12 +7,21 @@ fetch_financials.py — OpenDART API를 통한 재무제표 수집 모듈 (현
 
 [주요 함수]
   - mass_collect_financials(): 시가총액 상위 기업 목록(corp_list.csv) 기반
-    대량 재무제표 수집. 이어받기(resume) 로직 포함.
+    대량 재무제표 수집. collect_engine.py로 동시 조회(토큰 버킷 속도 제한, 재시도)하고
+    결과는 연도별 Parquet 저장소(parquet_store.py)에 추가. 저장소 매니페스트의
+    done/empty/failed 기록으로 이어받기(resume) (CSV 전체 재읽기 없음) + 요약 리포트.
   - get_refined_financials(): 단일 기업의 재무제표를 조회하고,
     processing_financials.refine_dart_res()로 8대 핵심 지표를 정제하여 반환.
+    기업 코드는 corp_list.csv 메모리 색인, 응답은 SQLite 캐시(dart_cache.py)에서 먼저 찾음
+    (반복 조회는 네트워크 호출 없이 메모리에서 반환). corp_code를 넘기면 기업 코드 조회 생략.
+    조회는 collect_engine.OpenDartClient.finstate (status 검사): 000·013(데이터 없음)만 캐시하고,
+    한도 초과(020)·점검(800)·키 오류 등은 캐시하지 않고 None (다음 조회에서 다시 시도).
 
 [의존]
   - processing_financials.py (같은 디렉토리) → refine_dart_res()
+  - dart_cache.py (같은 디렉토리) → DartResponseCache, CorpCodeIndex
+  - parquet_store.py (같은 디렉토리) → 대량 수집 시에만 로드
+  - collect_engine.py (같은 디렉토리) → 대량 수집, 단일 기업 조회(OpenDartClient) 시 로드
   - OpenDartReader, pandas, dotenv
 
 [참조하는 곳]
@@ -24,71 +33,98 @@ import os
 import time
 from dotenv import load_dotenv
 from processing_financials import refine_dart_res
+from dart_cache import CorpCodeIndex, DartResponseCache
 
 env_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', '.env')
 load_dotenv(env_path)
 dart = OpenDartReader(os.getenv("DART_API_KEY"))
 
-def mass_collect_financials(target_year=2024):
+def mass_collect_financials(target_year=2024, store=None, client=None, workers=4, rate=8.0, daily_limit=20_000):
+    """
+    상장사 재무제표 대량 수집 (collect_engine.CollectEngine)
+    workers: 동시 조회 수 / rate: 초당 호출 상한 (OpenDART 분당 한도 이하로) / daily_limit: 하루 호출 상한
+    client: finstate_all을 가진 객체 (기본: collect_engine.OpenDartClient, 테스트용 가짜 주입 가능)
+        OpenDartReader는 API 오류(한도 초과, 키 오류)에도 빈 DataFrame을 돌려줘 '데이터 없음'으로 기록되므로 쓰지 않음
+    """
+    from collect_engine import CollectEngine, OpenDartClient
+    from parquet_store import ParquetStatementStore
+
     list_path = "../../data/raw/corp_list.csv"
-    save_path = f"../../data/raw/fs_full_{target_year}.csv"
+    legacy_csv = f"../../data/raw/fs_full_{target_year}.csv"
+    store = store or ParquetStatementStore()
     
     # 1. 대상 리스트 로드
-    df_listed = pd.read_csv(list_path)
+    df_listed = pd.read_csv(list_path, dtype={'corp_code': str})
+
+    # 예전 방식으로 쌓인 CSV가 있으면 한 번만 저장소로 이전
+    if not store.done_corps(target_year) and os.path.exists(legacy_csv):
+        count = store.import_csv(legacy_csv, target_year)
+        print(f"📦 기존 CSV 이전: {legacy_csv} ({count}개 기업)")
     
-    # 2. 이어받기 로직: 기존에 저장된 파일이 있다면 이미 수집된 기업 제외
-    if os.path.exists(save_path):
-        existing_df = pd.read_csv(save_path)
-        done_corps = existing_df['corp_name_origin'].unique().tolist()
-        df_todo = df_listed[~df_listed['corp_name'].isin(done_corps)]
-        print(f"🔄 이어받기 모드: {len(done_corps)}개 완료, {len(df_todo)}개 남음")
-    else:
-        df_todo = df_listed
-        print(f"🚀 신규 수집 모드: 총 {len(df_todo)}개 기업 대상")
-
-    for idx, row in df_todo.iterrows():
-        name = row['corp_name']
-        code = str(row['corp_code']).zfill(8)
-        
+    # 2. 동시 수집 (매니페스트에 done/empty로 기록된 기업은 건너뛰고, failed는 다시 시도)
+    engine = CollectEngine(client or OpenDartClient(os.getenv("DART_API_KEY")), store, workers=workers, rate=rate, daily_limit=daily_limit,
+                           report_path=os.path.join(store.root, f"collect_report_{target_year}.json"))
+    corps = list(zip(df_listed['corp_code'], df_listed['corp_name']))
+    return engine.run(corps, target_year)
+
+# 응답 캐시 / 기업명 색인 / 정제 결과 메모 (첫 조회 때 한 번만 준비)
+_response_cache = None
+_corp_index = None
+_refined_memo = {}   # (corp_code, 연도) → (만료 시각, 정제 결과)
+_dart_client = None
+
+def _get_dart_client():
+    global _dart_client
+    if _dart_client is None:
+        from collect_engine import OpenDartClient
+        _dart_client = OpenDartClient(os.getenv("DART_API_KEY"))
+    return _dart_client
+
+def _get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = DartResponseCache()
+    return _response_cache
+
+def _find_corp_code(corp_name):
+    """corp_list.csv 메모리 색인 우선, 없으면(목록 파일 없음/미상장) DART 기업 목록 조회"""
+    global _corp_index
+    if _corp_index is None:
         try:
-            # 연결(CFS) 시도 -> 없으면 별도(OFS) 시도
-            fs = dart.finstate_all(code, target_year, reprt_code='11014', fs_div='CFS')
-            if fs is None:
-                fs = dart.finstate_all(code, target_year, reprt_code='11011', fs_div='OFS')
-            
-            if fs is not None:
-                fs['corp_name_origin'] = name
-                # 한 기업씩 바로 파일에 추가(Append) 모드로 저장하여 메모리 부담 감소 및 안정성 확보
-                header = not os.path.exists(save_path)
-                fs.to_csv(save_path, mode='a', index=False, header=header, encoding='utf-8-sig')
-                print(f"[{idx+1}/{len(df_listed)}] {name} ✅")
-            else:
-                print(f"[{idx+1}/{len(df_listed)}] {name} ⚠️ 데이터 없음 (Skip)")
-            
-            time.sleep(0.3) # API 제한 준수
-            
-        except Exception as e:
-            print(f"[{idx+1}/{len(df_listed)}] {name} ❌ 에러: {e}")
-            continue
+            _corp_index = CorpCodeIndex.from_csv()
+            print(f"🗂️ 기업 코드 색인 로드: {len(_corp_index):,}개 이름")
+        except (OSError, KeyError) as e:
+            print(f"⚠️ corp_list.csv 색인 사용 불가 ({e}), DART 조회로 대체")
+            _corp_index = CorpCodeIndex([])
+    return _corp_index.lookup(corp_name) or dart.find_corp_code(corp_name)
 
 # 특정 회사 정보 뽑아오는 코드
-def get_refined_financials(corp_name, target_year=2025):
+def get_refined_financials(corp_name, target_year=2025, corp_code=None):
     print(f"--- [TOOL] get_refined_financials 호출: {corp_name} ---")
     
     try:
         # [중요] finstate 호출 전, 기업 코드가 존재하는지 먼저 확인 (TypeError 방지)
-        corp_code = dart.find_corp_code(corp_name)
+        # (corp_matcher 등으로 이미 코드를 알고 있으면 조회 생략)
+        corp_code = corp_code or _find_corp_code(corp_name)
         if not corp_code:
             print(f"❌ 기업 코드를 찾을 수 없음: {corp_name}")
             return None
 
-        # 코드가 있을 때만 호출
-        res = dart.finstate(corp_code, target_year, reprt_code='11014')
-        
-        if res is None or (isinstance(res, pd.DataFrame) and res.empty):
-            return None
-            
-        return refine_dart_res(res, corp_name)
+        # 같은 기업·연도의 반복 조회는 정제 결과를 그대로 반환 (네트워크/DataFrame 처리 없음)
+        memo_key = (corp_code, str(target_year))
+        hit = _refined_memo.get(memo_key)
+        if hit and hit[0] > time.time():
+            return {**hit[1], 'corp_name': corp_name.strip()} if hit[1] else None
+
+        # 코드가 있을 때만 호출 (응답은 디스크 캐시, 회계 기간이 닫혔는지에 따라 TTL 다름)
+        # dart.finstate는 한도 초과·키 오류에도 빈 DataFrame을 돌려줘 '데이터 없음'으로 캐시되므로 쓰지 않음.
+        # OpenDartClient는 그런 status를 DartStatusError로 올려 캐시/메모에 남지 않음
+        cache = _get_response_cache()
+        res = cache.get_or_fetch('finstate', corp_code, target_year, '11014', 'ALL',
+                                 lambda: _get_dart_client().finstate(corp_code, target_year, reprt_code='11014'))
+        refined = refine_dart_res(res, corp_name) if res is not None else None
+        _refined_memo[memo_key] = (time.time() + cache.ttl_for(target_year, '11014', empty=refined is None), refined)
+        return dict(refined) if refined else None
         
     except Exception as e:
         print(f"DART API Error: {e}")
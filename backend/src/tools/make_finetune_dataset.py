@@ -1,6 +1,7 @@
 import pandas as pd
 import json
 import os
+import io
 import re
 
 # ==========================================
@@ -17,6 +18,16 @@ TARGET_MAPPING = {
     '자본금': {'id': 'ifrs-full_IssuedCapital', 'nm': '자본금'},
 }
 
+# account_id → 지표명 (정확 일치 조인용)
+ID_TO_INDICATOR = {target['id']: key for key, target in TARGET_MAPPING.items()}
+
+# 컬럼 인덱스 설정 (표준 DART CSV 구조 기준, 기업명은 마지막 컬럼)
+IDX_ID, IDX_NM, IDX_YEAR, IDX_AMOUNT = 6, 7, 2, 10
+
+# 스트리밍 모드: 한 번에 읽는 행 수 / 인코딩·구분자 판별용 앞부분 크기
+CHUNK_ROWS = 200_000
+SAMPLE_BYTES = 1 << 20
+
 # CSV 파일 경로 (사용자 환경에 맞게 수정)
 FILE_LIST = [
     '../../data/raw/fs_full_2023.csv',
@@ -34,8 +45,151 @@ def clean_amount(val):
     except:
         return None
 
-def extract_comprehensive_data(file_list):
-    """CSV 파일들에서 재무 데이터를 추출하고 회사/연도별로 통합"""
+def detect_csv_format(file, sample_bytes=SAMPLE_BYTES):
+    """파일 앞부분만 읽어 (인코딩, 구분자, 컬럼 수) 판별. 실패 시 None"""
+    with open(file, 'rb') as f:
+        sample = f.read(sample_bytes)
+    # 잘린 마지막 줄(멀티바이트 문자 중간일 수 있음)은 버림
+    if len(sample) == sample_bytes and b'\n' in sample:
+        sample = sample[:sample.rfind(b'\n') + 1]
+
+    for enc in ['utf-8-sig', 'cp949']:
+        try:
+            text = sample.decode(enc)
+        except UnicodeDecodeError:
+            continue
+        for s in [',', '\t']:
+            try:
+                # 첫 줄 'corp_name_origin' 건너뛰기
+                temp_df = pd.read_csv(io.StringIO(text), header=None, sep=s, skiprows=1,
+                                      dtype=str, on_bad_lines='skip')
+            except Exception:
+                continue
+            if temp_df.shape[1] > 10:
+                return enc, s, temp_df.shape[1]
+    return None
+
+
+def _match_chunk(chunk, id_col=IDX_ID, nm_col=IDX_NM, year_col=IDX_YEAR, amount_col=IDX_AMOUNT, corp_col=None):
+    """
+    청크 → (corp_name, year, indicator, amount) 매칭 결과 (행 순서 유지, 벡터 연산)
+    컬럼 키 기본값은 헤더 없는 CSV의 위치 인덱스 (corp_col=None → 마지막 컬럼)
+    """
+    acc_id = chunk[id_col].fillna('').str.strip()
+    acc_nm = chunk[nm_col].fillna('').str.strip()
+
+    # 금액: 숫자/부호/소수점만 남기고 변환 (변환 불가 → NaN)
+    cleaned = chunk[amount_col].fillna('').str.replace(r'[^0-9.\-]', '', regex=True)
+    amount = pd.to_numeric(cleaned, errors='coerce')
+    valid = amount.notna()
+
+    # 1. ID 정확 일치 (조인)
+    id_match = acc_id.map(ID_TO_INDICATOR)
+    # 부채 추출 시 '자본' 혼입 방지
+    liability_excluded = acc_nm.str.contains('자본', regex=False) | acc_id.str.contains('Equity', regex=False)
+
+    parts = []
+    for key, target in TARGET_MAPPING.items():
+        # 2. 명칭 매칭 (ID가 일치하지 않을 때만 적용되던 제외 규칙 유지)
+        name_match = acc_nm.str.contains(target['nm'], regex=False)
+        if key == '부채총계':
+            name_match &= ~liability_excluded
+        mask = ((id_match == key) | name_match) & valid
+        if mask.any():
+            parts.append(pd.DataFrame({'row': chunk.index[mask], 'indicator': key,
+                                       'amount': amount[mask].astype('int64')}))
+    if not parts:
+        return None
+
+    matched = pd.concat(parts).sort_values('row', kind='stable')
+    corp = chunk.iloc[:, -1] if corp_col is None else chunk[corp_col]
+    matched['corp_name'] = corp.fillna('nan').str.strip().loc[matched['row']].values
+    matched['year'] = chunk[year_col].fillna('nan').str.strip().loc[matched['row']].values
+    return matched
+
+
+def _accumulate(first_values, matched):
+    """(회사, 연도, 지표)별 첫 값만 누적. 반환: 이번 청크의 매칭 건수"""
+    if matched is None:
+        return 0
+    count = len(matched)
+    matched = matched.drop_duplicates(['corp_name', 'year', 'indicator'])
+    for corp_name, year, indicator, amount in zip(matched['corp_name'], matched['year'],
+                                                  matched['indicator'], matched['amount']):
+        first_values.setdefault((corp_name, year, indicator), int(amount))
+    return count
+
+
+def _pivot(first_values):
+    """누적 결과 → 회사/연도별 한 줄 요약"""
+    if not first_values: return pd.DataFrame()
+
+    raw_df = pd.DataFrame([(c, y, i, a) for (c, y, i), a in first_values.items()],
+                          columns=['corp_name', 'year', 'indicator', 'amount'])
+    return raw_df.pivot_table(
+        index=['corp_name', 'year'], columns='indicator', values='amount', aggfunc='first'
+    ).reset_index()
+
+
+def _extract_streaming(file_list, chunksize):
+    """파일을 청크 단위로 읽으며 (회사, 연도, 지표)별 첫 값만 누적 → 메모리는 결과 크기에만 비례"""
+    first_values = {}   # (corp_name, year, indicator) → amount (먼저 나온 값 우선)
+
+    for file in file_list:
+        if not os.path.exists(file):
+            print(f"파일 없음: {file}")
+            continue
+
+        print(f"--- {file} 분석 시작 (스트리밍) ---")
+        detected = detect_csv_format(file)
+        if detected is None:
+            print(f"실패: {file}을 읽을 수 없습니다.")
+            continue
+        enc, s, ncols = detected
+        sep_name = 'TAB' if s == '\t' else 'COMMA'
+        print(f"형식 판별: 인코딩 {enc}, 구분자 '{sep_name}', 컬럼 {ncols}개")
+
+        # 필요한 컬럼만, C 엔진으로 청크 단위 읽기 (기업명 = 마지막 컬럼)
+        usecols = sorted({IDX_YEAR, IDX_ID, IDX_NM, IDX_AMOUNT, ncols - 1})
+        reader = pd.read_csv(file, header=None, encoding=enc, sep=s, skiprows=1, engine='c',
+                             usecols=usecols, dtype=str,
+                             on_bad_lines='skip', chunksize=chunksize)
+        match_count = 0
+        for chunk in reader:
+            match_count += _accumulate(first_values, _match_chunk(chunk))
+        print(f"추출 완료: {match_count}건")
+
+    return _pivot(first_values)
+
+
+def extract_from_parquet(store_root=None, years=None, chunksize=CHUNK_ROWS):
+    """
+    Parquet 저장소(parquet_store.py)에서 지표 추출에 필요한 5개 컬럼과 지정 연도 분할만 읽어 처리
+    (인코딩 추측/CSV 파싱 없음). 결과 형식은 extract_comprehensive_data와 같음
+    """
+    from parquet_store import DEFAULT_ROOT, ParquetStatementStore
+
+    store = ParquetStatementStore(store_root or DEFAULT_ROOT)
+    columns = ['bsns_year', 'account_id', 'account_nm', 'thstrm_amount', 'corp_name_origin']
+    first_values, match_count = {}, 0
+    print(f"--- {store.root} 분석 시작 (Parquet, 연도: {years or '전체'}) ---")
+    for batch in store.iter_batches(columns=columns, years=years, batch_size=chunksize):
+        match_count += _accumulate(first_values, _match_chunk(
+            batch, id_col='account_id', nm_col='account_nm', year_col='bsns_year',
+            amount_col='thstrm_amount', corp_col='corp_name_origin'))
+    print(f"추출 완료: {match_count}건")
+    return _pivot(first_values)
+
+
+def extract_comprehensive_data(file_list, streaming=True, chunksize=CHUNK_ROWS):
+    """
+    CSV 파일들에서 재무 데이터를 추출하고 회사/연도별로 통합
+    streaming=True: 인코딩/구분자를 앞부분으로 한 번만 판별하고 청크 단위 + 벡터 연산으로 처리 (수 GB 파일용)
+    streaming=False: 파일 전체를 읽어 행 단위로 처리하는 기존 방식 (결과 비교용)
+    """
+    if streaming:
+        return _extract_streaming(file_list, chunksize)
+
     all_data = []
     
     for file in file_list:
@@ -65,8 +219,7 @@ def extract_comprehensive_data(file_list):
             print(f"실패: {file}을 읽을 수 없습니다.")
             continue
 
-        # 컬럼 인덱스 설정 (표준 DART CSV 구조 기준)
-        idx_id, idx_nm, idx_year, idx_amount = 6, 7, 2, 10
+        idx_id, idx_nm, idx_year, idx_amount = IDX_ID, IDX_NM, IDX_YEAR, IDX_AMOUNT
         
         match_count = 0
         for _, row in df.iterrows():
@@ -169,8 +322,12 @@ def create_json_dataset(df):
     return dataset
 
 if __name__ == "__main__":
-    # 1. 데이터 추출
-    final_df = extract_comprehensive_data(FILE_LIST)
+    # 1. 데이터 추출 (수집 결과가 Parquet 저장소에 있으면 우선 사용)
+    from parquet_store import DEFAULT_ROOT
+    if os.path.exists(os.path.join(DEFAULT_ROOT, "_manifest.json")):
+        final_df = extract_from_parquet(DEFAULT_ROOT)
+    else:
+        final_df = extract_comprehensive_data(FILE_LIST)
     
     if not final_df.empty:
         # 2. 지표 계산 및 데이터셋 변환
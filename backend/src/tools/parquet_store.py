@@ -0,0 +1,212 @@
+"""
+parquet_store.py — 수집한 DART 재무제표 원시 데이터용 연도별 분할 Parquet 저장소
+
+[역할]
+  fetch_financials.mass_collect_financials는 원시 재무제표를 fs_full_{year}.csv에 이어 붙이고,
+  재시작할 때마다 이어받기 대상을 구하려고 CSV 전체를 다시 읽었다. 이후 도구들도 인코딩을 추측하며
+  CSV 텍스트를 매번 다시 파싱한다. 이를 컬럼 단위 저장소로 대체한다.
+  - 분할: {root}/bsns_year=2024/[reprt_code=11014/]part-*.parquet (hive 형식, 연도 + 선택적으로 보고서 코드)
+  - 기업/계정 컬럼은 사전(dictionary) 인코딩, 나머지 값은 문자열 그대로 저장 (DART 응답 원문 보존)
+  - 추가(append): 기업 단위로 버퍼에 모았다가 buffer_rows마다 파일 하나로 기록
+      파일 이름은 기록 순서(시각 + 일련번호)라서, 이름순으로 읽으면 CSV에 이어 붙인 순서와 같음
+      (지표 추출은 (기업, 연도, 지표)별 첫 값을 쓰므로 한 기업이 여러 파일에 걸쳐도 결과가 같아야 함)
+  - 매니페스트(_manifest.json): 연도별 corp_code → 상태(done / empty / failed) → 이어받기 검사 O(1)
+      failed는 완료로 보지 않으므로 다음 실행에서 다시 시도됨
+      파일 기록이 끝난 뒤에만 매니페스트를 갱신하므로, 중간에 죽어도 '완료'인데 데이터가 없는 기업은 없음
+  - 읽기: 필요한 컬럼과 분할(연도/보고서 코드)만 읽음 (read / iter_batches)
+
+[주요 클래스/함수]
+  - ParquetStatementStore(root, partition_by_report, buffer_rows)
+      append(df, year, corp_code) / mark(year, corp_code, status) / is_done(year, corp_code) / flush()
+      read(columns, years, reprt_codes, corp_codes) / iter_batches(...) / import_csv(csv_path, year)
+
+[의존]
+  - pyarrow, pandas
+
+[참조하는 곳]
+  - fetch_financials.py / collect_engine.py → mass_collect_financials (수집 결과 저장, 이어받기, 체크포인트)
+  - make_finetune_dataset.py → extract_from_parquet (필요한 컬럼/연도만 읽어 지표 추출)
+"""
+import os
+import json
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_ROOT = "../../data/parquet/statements"
+
+# 값 종류가 적고 반복이 많은 컬럼 → 사전 인코딩
+DICTIONARY_COLUMNS = ['corp_code', 'corp_name_origin', 'account_id', 'account_nm', 'account_detail',
+                      'sj_div', 'sj_nm', 'fs_div', 'currency', 'thstrm_nm', 'frmtrm_nm', 'bfefrmtrm_nm']
+
+
+class ParquetStatementStore:
+    def __init__(self, root=DEFAULT_ROOT, partition_by_report=False, buffer_rows=50_000):
+        self.root = root
+        self.buffer_rows = buffer_rows
+        self.manifest_path = os.path.join(root, "_manifest.json")
+        self.manifest = self._load_manifest(partition_by_report)
+        # 분할 방식은 처음 만들 때 정해지고 매니페스트에 기록됨
+        self.partition_by_report = self.manifest["partition_by_report"]
+        self._status = {year: dict(codes) for year, codes in self.manifest["corps"].items()}
+        self._buffer, self._buffered_rows, self._pending = [], 0, []
+        self._seq = 0
+
+    # --- [매니페스트] ---
+
+    def _load_manifest(self, partition_by_report):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"partition_by_report": partition_by_report, "corps": {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest["corps"] = self._status
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_done(self, year, corp_code):
+        """이미 처리한 기업인지 (데이터 저장 완료 또는 '데이터 없음'으로 기록됨, failed는 제외)"""
+        return self._status.get(str(year), {}).get(str(corp_code).zfill(8)) in ("done", "empty")
+
+    def done_corps(self, year, status=None):
+        codes = self._status.get(str(year), {})
+        return {c for c, s in codes.items() if status is None or s == status}
+
+    def mark(self, year, corp_code, status="done"):
+        """처리 결과 기록. 다음 flush 때 영속화 (그 전에 중단되면 해당 기업만 다시 처리됨)"""
+        self._pending.append((str(year), str(corp_code).zfill(8), status))
+
+    # --- [쓰기] ---
+
+    def append(self, df, year, corp_code=None):
+        """원시 재무제표 DataFrame 추가. corp_code를 주면 flush 시 완료로 기록"""
+        if df is not None and not df.empty:
+            df = df.astype(str).where(df.notna(), None)
+            df['bsns_year'] = str(year)
+            self._buffer.append(df)
+            self._buffered_rows += len(df)
+        if corp_code is not None:
+            self._pending.append((str(year), str(corp_code).zfill(8), "done"))
+        if self._buffered_rows >= self.buffer_rows:
+            self.flush()
+
+    def _partition_dir(self, keys):
+        parts = [f"bsns_year={keys[0]}"]
+        if self.partition_by_report:
+            parts.append(f"reprt_code={keys[1]}")
+        return os.path.join(self.root, *parts)
+
+    def flush(self):
+        """버퍼 → 분할별 parquet 파일 1개씩 기록 → 매니페스트 갱신"""
+        if self._buffer:
+            data = pd.concat(self._buffer, ignore_index=True)
+            keys = ['bsns_year', 'reprt_code'] if self.partition_by_report else ['bsns_year']
+            if 'reprt_code' not in data:
+                data['reprt_code'] = None
+            data['reprt_code'] = data['reprt_code'].fillna('unknown')
+            for key, group in data.groupby(keys, sort=False):
+                key = key if isinstance(key, tuple) else (key,)
+                path = os.path.join(self._partition_dir(key), f"part-{time.time_ns():020d}-{self._seq:06d}.parquet")
+                self._seq += 1
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # 분할 키는 경로에 있으므로 파일에는 저장하지 않음
+                table = pa.Table.from_pandas(group.drop(columns=keys), preserve_index=False)
+                table = table.cast(pa.schema([pa.field(f.name, pa.string()) for f in table.schema]))
+                pq.write_table(table, path, compression='zstd',
+                               use_dictionary=[c for c in DICTIONARY_COLUMNS if c in table.column_names])
+            self._buffer, self._buffered_rows = [], 0
+
+        if self._pending:
+            for year, code, status in self._pending:
+                self._status.setdefault(year, {})[code] = status
+            self._pending = []
+            self._save_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def import_csv(self, csv_path, year, chunksize=200_000, encoding='utf-8-sig'):
+        """기존 fs_full_{year}.csv → 저장소로 이전 (청크 단위). 포함된 corp_code는 완료로 기록"""
+        codes = set()
+        for chunk in pd.read_csv(csv_path, dtype=str, encoding=encoding, chunksize=chunksize, on_bad_lines='skip'):
+            self.append(chunk, year)
+            if 'corp_code' in chunk:
+                codes.update(chunk['corp_code'].dropna().str.zfill(8))
+        for code in codes:
+            self._pending.append((str(year), code, "done"))
+        self.flush()
+        return len(codes)
+
+    # --- [읽기] ---
+
+    def dataset(self):
+        fields = [pa.field('bsns_year', pa.string())]
+        if self.partition_by_report:
+            fields.append(pa.field('reprt_code', pa.string()))
+        partitioning = ds.partitioning(pa.schema(fields), flavor="hive")
+        files = [os.path.join(d, f) for d, _, names in os.walk(self.root) for f in names if f.endswith(".parquet")]
+        # os.walk 순서가 아니라 기록 순서로 (분할이 달라도 파일 이름 기준)
+        files.sort(key=os.path.basename)
+        if not files:
+            return None
+        # 기업마다 DART 응답 컬럼이 조금씩 다를 수 있어 스키마를 합침 (파일 footer만 읽음)
+        schema = pa.unify_schemas([pq.read_schema(f) for f in files] + [pa.schema(fields)])
+        return ds.dataset(files, schema=schema, format="parquet", partitioning=partitioning,
+                          partition_base_dir=self.root)
+
+    @staticmethod
+    def _filter(years=None, reprt_codes=None, corp_codes=None):
+        conditions = []
+        if years:
+            conditions.append(ds.field('bsns_year').isin([str(y) for y in years]))
+        if reprt_codes:
+            conditions.append(ds.field('reprt_code').isin([str(c) for c in reprt_codes]))
+        if corp_codes:
+            conditions.append(ds.field('corp_code').isin([str(c).zfill(8) for c in corp_codes]))
+        expr = None
+        for cond in conditions:
+            expr = cond if expr is None else expr & cond
+        return expr
+
+    def iter_batches(self, columns=None, years=None, reprt_codes=None, corp_codes=None, batch_size=200_000):
+        """필요한 컬럼/분할만 batch_size 행씩 DataFrame으로 (메모리는 배치 크기에 비례)"""
+        dataset = self.dataset()
+        if dataset is None:
+            return
+        columns = [c for c in columns if c in dataset.schema.names] if columns else None
+        for batch in dataset.to_batches(columns=columns, filter=self._filter(years, reprt_codes, corp_codes),
+                                        batch_size=batch_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def read(self, columns=None, years=None, reprt_codes=None, corp_codes=None):
+        dataset = self.dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=columns or [])
+        columns = [c for c in columns if c in dataset.schema.names] if columns else None
+        return dataset.to_table(columns=columns, filter=self._filter(years, reprt_codes, corp_codes)).to_pandas()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="fs_full_{year}.csv → Parquet 저장소 이전")
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("--year", required=True)
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--by-report", action="store_true", help="보고서 코드(reprt_code)로도 분할")
+    args = parser.parse_args()
+
+    store = ParquetStatementStore(args.root, partition_by_report=args.by_report)
+    count = store.import_csv(args.csv, args.year)
+    print(f"✅ {args.csv} → {args.root} (기업 {count}개 완료 기록)")
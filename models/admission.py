@@ -0,0 +1,200 @@
+"""
+admission.py — 요청 수용 제어 (동시 실행 상한 + 대기열 상한 + 단계별 타임아웃)
+
+[역할]
+  버스트 트래픽에서 그래프 실행과 Gemini 호출이 무제한으로 몰려 스레드 풀이 포화되고
+  공급자 rate limit에 걸려 모두의 꼬리 지연이 폭증하는 것을 막는다.
+  - 파이프라인(그래프 실행) 동시 실행 수와 LLM 동시 호출 수를 각각 제한
+  - 자리가 없으면 상한이 있는 대기열에서 기다리고, 대기열마저 차면 Overloaded로 즉시 거절 (API에서 429)
+  - 동기 노드(route/retrieve/grade/transform)는 크기가 정해진 전용 스레드 풀에서 실행
+  - retrieve / grade / generate 노드별 타임아웃 (넘기면 StageTimeout)
+
+[주요 클래스]
+  - ConcurrencyLimiter: 스레드/이벤트 루프 어디서든 쓸 수 있는 세마포어 + 대기열 상한
+      · async with limiter.slot(timeout)  (이벤트 루프)
+      · with limiter.sync_slot(timeout)   (스레드 풀 안의 동기 노드)
+  - AdmissionController: 위 두 제한 + 전용 실행기 + 노드 타임아웃 묶음 (환경 변수로 설정)
+
+[환경 변수] (기본값)
+  MAX_CONCURRENT_PIPELINES=8   MAX_PIPELINE_QUEUE=32   PIPELINE_QUEUE_TIMEOUT=10
+  MAX_CONCURRENT_LLM=4         GRAPH_WORKERS=8
+  TIMEOUT_RETRIEVE=10          TIMEOUT_GRADE=20        TIMEOUT_GENERATE=60   (초, 0이면 제한 없음)
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG(admission=...), 노드 실행/LLM 호출
+  - main.py → 대기열이 꽉 찼으면 429 + Retry-After
+"""
+import os
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry import Counter
+
+
+class Overloaded(Exception):
+    """대기열이 가득 찼거나 대기 시간이 지나 요청을 받을 수 없음"""
+
+    def __init__(self, name, retry_after=1):
+        super().__init__(f"{name}: 요청이 많아 처리할 수 없습니다.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class StageTimeout(Exception):
+    """그래프 노드가 정해진 시간 안에 끝나지 않음"""
+
+    def __init__(self, stage, seconds):
+        super().__init__(f"{stage} 단계가 {seconds}초 안에 끝나지 않았습니다.")
+        self.stage = stage
+        self.seconds = seconds
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name, limit, max_queue=None, retry_after=1):
+        """limit: 동시 실행 수 / max_queue: 대기 가능한 수 (None이면 무제한)"""
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()   # 자리를 기다리는 (이벤트 루프, Future) 또는 (None, threading.Event)
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def full(self):
+        """자리도 대기열도 없으면 True (API에서 미리 거절할 때 사용)"""
+        with self._lock:
+            return self._active >= self.limit and self.max_queue is not None and len(self._waiters) >= self.max_queue
+
+    def check(self):
+        """full()과 같지만 꽉 찼으면 거절 수를 세고 Overloaded (판단과 집계를 한 잠금 안에서)"""
+        with self._lock:
+            if self._active >= self.limit and self.max_queue is not None and len(self._waiters) >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise Overloaded(self.name, self.retry_after)
+
+    def stats(self):
+        with self._lock:
+            return {"active": self._active, "waiting": len(self._waiters), "limit": self.limit,
+                    "max_queue": self.max_queue, **self.counters}
+
+    def _enter(self, waiter):
+        """자리가 있으면 True, 없으면 대기열에 waiter 등록 후 False (대기열이 차면 Overloaded)"""
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                self.counters["admitted"] += 1
+                return True
+            if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise Overloaded(self.name, self.retry_after)
+            self._waiters.append(waiter)
+            self.counters["queued"] += 1
+            return False
+
+    def _abandon(self, waiter):
+        """대기를 포기. 이미 자리를 넘겨받았으면 False (호출한 쪽이 release 해야 함)"""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return False
+            self.counters["timed_out"] += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._active -= 1
+                return
+            # 자리를 반납하지 않고 다음 대기자에게 바로 넘김 (active 유지)
+            loop, handle = self._waiters.popleft()
+            self.counters["admitted"] += 1
+        if loop is None:
+            handle.set()
+        else:
+            loop.call_soon_threadsafe(lambda: handle.done() or handle.set_result(True))
+
+    @asynccontextmanager
+    async def slot(self, timeout=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        if not self._enter(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if not self._abandon(waiter):
+                    self.release()   # 포기하는 사이 자리를 넘겨받음 → 다시 반납
+                if isinstance(e, asyncio.TimeoutError):
+                    raise Overloaded(self.name, self.retry_after) from None
+                raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def sync_slot(self, timeout=None):
+        event = threading.Event()
+        waiter = (None, event)
+        if not self._enter(waiter) and not event.wait(timeout):
+            if self._abandon(waiter):
+                raise Overloaded(self.name, self.retry_after)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _env_timeout(name, default):
+    value = float(os.getenv(name, default))
+    return value if value > 0 else None
+
+
+class AdmissionController:
+    def __init__(self, max_pipelines=None, max_queue=None, queue_timeout=None, max_llm=None,
+                 graph_workers=None, timeouts=None):
+        max_pipelines = max_pipelines or int(os.getenv("MAX_CONCURRENT_PIPELINES", 8))
+        max_queue = max_queue if max_queue is not None else int(os.getenv("MAX_PIPELINE_QUEUE", 32))
+        self.queue_timeout = queue_timeout or _env_timeout("PIPELINE_QUEUE_TIMEOUT", 10)
+
+        self.pipeline = ConcurrencyLimiter("pipeline", max_pipelines, max_queue, retry_after=2)
+        # LLM 대기는 파이프라인 수로 이미 제한되므로 대기열 상한 없이 노드 타임아웃에 맡김
+        self.llm = ConcurrencyLimiter("llm", max_llm or int(os.getenv("MAX_CONCURRENT_LLM", 4)))
+
+        # 동기 노드 전용 스레드 풀 (기본 실행기를 다른 작업과 나눠 쓰지 않도록)
+        workers = graph_workers or int(os.getenv("GRAPH_WORKERS", max_pipelines))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graph")
+
+        self.timeouts = {
+            "retrieve": _env_timeout("TIMEOUT_RETRIEVE", 10),
+            "grade": _env_timeout("TIMEOUT_GRADE", 20),
+            "generate": _env_timeout("TIMEOUT_GENERATE", 60),
+        }
+        self.timeouts.update(timeouts or {})
+        self.counters = Counter("admission", "수용 제어 집계 (kind별)")
+
+    def check(self):
+        """대기열까지 꽉 찼으면 Overloaded (스트리밍 응답을 시작하기 전에 429로 거절)"""
+        self.pipeline.check()
+
+    async def run_stage(self, stage, fn, *args):
+        """동기 함수 → 전용 스레드 풀, 코루틴 함수 → 그대로. stage 타임아웃 적용"""
+        if asyncio.iscoroutinefunction(fn):
+            work = fn(*args)
+        else:
+            work = asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        try:
+            return await asyncio.wait_for(work, self.timeouts.get(stage))
+        except asyncio.TimeoutError:
+            self.counters.inc(kind="stage_timeouts")
+            raise StageTimeout(stage, self.timeouts[stage]) from None
+
+    def stats(self):
+        return {"pipeline": self.pipeline.stats(), "llm": self.llm.stats(),
+                "timeouts": self.timeouts, **self.counters.totals("kind", ("stage_timeouts",))}
@@ -0,0 +1,142 @@
+"""
+answer_cache.py — 질문 임베딩 기반 시맨틱 답변 캐시 (TTL + LRU)
+
+[역할]
+  "삼성전자 영업이익 알려줘" / "삼성전자의 영업이익은?" 처럼 표현만 다른 반복 질문에 대해
+  이전에 생성한 답변을 재사용하여 Gemini 호출(검색·평가·생성)을 통째로 생략한다.
+
+[동작]
+  - 키: FinanceRAG가 검색용으로 계산하는 질문 임베딩 (ko-sroberta-multitask)
+  - 히트 조건: 코사인 유사도 >= threshold  AND  질문에서 뽑은 기업/연도/지표가 동일
+    (임베딩만 보면 '삼성전자 영업이익'과 'SK하이닉스 영업이익'이 매우 가까우므로 엔티티로 한 번 더 확인)
+  - 만료: 저장 후 ttl초가 지나면 무효
+  - 축출: max_entries / max_bytes를 넘으면 가장 오래 안 쓰인 항목부터 제거 (LRU)
+  - 무효화: 벡터 DB가 갱신되면 invalidate()로 전체 비움
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG.query_stream (조회/저장), FinanceRAG.update_data (신규 문서 적재 시 무효화)
+  - main.py → GET /cache/stats
+"""
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 항목당 고정 오버헤드 추정치 (dict, 키, 타임스탬프 등)
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=1000, max_bytes=32 * 1024 * 1024):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id → {"vector", "entities", "answer", "created", "size"} (LRU 순서)
+        self._next_id = 0
+        self._bytes = 0
+
+        # 유사도 계산용 행렬 캐시 (항목이 바뀌면 다시 쌓음)
+        self._matrix = None
+        self._matrix_ids = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    @staticmethod
+    def _entity_key(entities):
+        return tuple(tuple(sorted(entities.get(k, ()))) for k in ("companies", "years", "metrics"))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry["size"]
+        self._matrix = None
+
+    def _purge_expired(self, now):
+        expired = [i for i, e in self._entries.items() if now - e["created"] > self.ttl]
+        for entry_id in expired:
+            self._remove(entry_id)
+        self.expirations += len(expired)
+
+    def lookup(self, vector, entities):
+        """유사한 질문의 캐시된 답변을 반환 (없으면 None)"""
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_ids = list(self._entries.keys())
+                self._matrix = np.stack([self._entries[i]["vector"] for i in self._matrix_ids])
+
+            scores = self._matrix @ self._normalize(vector)
+            key = self._entity_key(entities)
+            for pos in np.argsort(-scores):
+                if scores[pos] < self.threshold:
+                    break
+                entry_id = self._matrix_ids[pos]
+                entry = self._entries[entry_id]
+                if entry["entities"] == key:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, vector, entities, answer):
+        vec = self._normalize(vector)
+        size = vec.nbytes + len(answer.encode("utf-8")) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": vec,
+                "entities": self._entity_key(entities),
+                "answer": answer,
+                "created": time.monotonic(),
+                "size": size,
+            }
+            self._next_id += 1
+            self._bytes += size
+            self._matrix = None
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        """벡터 DB 갱신 시 호출: 이전 데이터로 만든 답변을 모두 버림"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._matrix = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,105 @@
+"""
+bench_embeddings.py — 임베딩 백엔드(hf fp32 vs onnx int8) 정합성 검사 + 벤치마크
+
+[역할]
+  1. 정합성: 같은 텍스트에 대한 두 백엔드 벡터의 코사인 유사도(평균/최소)와,
+     질문별 문서 검색 top-k 결과 겹침 비율(overlap@k)을 계산
+  2. 성능: 질문 1건 임베딩 지연(p50/p95)과 대량 적재 처리량(문서/초)을 측정
+
+[사용법]
+  cd models
+  python bench_embeddings.py --data top_30_financial_data.jsonl --k 5 --queries 200
+
+  정합성 기준(--min-cos, --min-overlap)을 밑돌면 종료 코드 1로 끝나므로 CI에서 회귀 검사로도 사용 가능.
+"""
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+from metric_store import METRIC_ALIASES, parse_record_output
+from onnx_embeddings import make_embeddings
+
+
+def load_corpus(path):
+    """벡터 DB에 들어가는 본문(레코드 JSON)과 레코드 기반 질문 목록"""
+    docs, questions = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            docs.append(json.dumps(record, ensure_ascii=False))
+            output = parse_record_output(record)
+            if output:
+                meta = output["metadata"]
+                for metric in METRIC_ALIASES:
+                    questions.append(f"{meta['company']} {meta['fiscal_year']}년 {metric}")
+    return docs, questions
+
+
+def normalize(m):
+    m = np.asarray(m, dtype=np.float32)
+    return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-9, None)
+
+
+def percentile_ms(samples, p):
+    return float(np.percentile(samples, p) * 1000)
+
+
+def bench_backend(name, embeddings, docs, questions):
+    # 워밍업 (토크나이저 초기화 / 첫 forward 비용 제외)
+    embeddings.embed_query(questions[0])
+
+    latencies = []
+    for q in questions:
+        start = time.perf_counter()
+        embeddings.embed_query(q)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    doc_vectors = embeddings.embed_documents(docs)
+    ingest_seconds = time.perf_counter() - start
+
+    query_vectors = embeddings.embed_documents(questions)
+    print(f"[{name}] query p50 {percentile_ms(latencies, 50):.1f}ms / p95 {percentile_ms(latencies, 95):.1f}ms"
+          f" | ingest {len(docs) / ingest_seconds:.1f} docs/s ({ingest_seconds:.1f}s)")
+    return normalize(query_vectors), normalize(doc_vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="임베딩 백엔드 정합성·성능 비교")
+    parser.add_argument("--data", default="top_30_financial_data.jsonl")
+    parser.add_argument("--queries", type=int, default=200, help="샘플 질문 수")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="onnxruntime intra-op 스레드 수")
+    parser.add_argument("--min-cos", type=float, default=0.98)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args()
+
+    docs, questions = load_corpus(args.data)
+    random.Random(0).shuffle(questions)
+    questions = questions[:args.queries]
+    print(f"📚 문서 {len(docs)}건 / 질문 {len(questions)}건")
+
+    hf_q, hf_d = bench_backend("hf fp32", make_embeddings("hf"), docs, questions)
+    ox_q, ox_d = bench_backend("onnx int8", make_embeddings("onnx", intra_op_threads=args.threads), docs, questions)
+
+    cos = np.concatenate([(hf_q * ox_q).sum(axis=1), (hf_d * ox_d).sum(axis=1)])
+    k = min(args.k, len(docs))
+    hf_top = np.argsort(-(hf_q @ hf_d.T), axis=1)[:, :k]
+    ox_top = np.argsort(-(ox_q @ ox_d.T), axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(hf_top, ox_top)])
+
+    print(f"🎯 cosine(hf, onnx) 평균 {cos.mean():.4f} / 최소 {cos.min():.4f}")
+    print(f"🎯 top-{k} overlap {overlap:.3f}")
+
+    ok = cos.mean() >= args.min_cos and overlap >= args.min_overlap
+    print("✅ 정합성 통과" if ok else "❌ 정합성 기준 미달")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+bench_load.py — /chat/stream 부하 벤치마크 (오프라인: 가짜 LLM·임베딩)
+
+[역할]
+  Gemini 쿼터와 네트워크 없이 노트북에서 API + 그래프의 처리량/꼬리 지연 회귀를 잡는다.
+  1. top_30_financial_data.jsonl로 Chroma 색인 구축 (FakeEmbeddings, --db 폴더에 재사용)
+  2. FakeChatModel / FakeEmbeddings를 주입한 FinanceRAG로 uvicorn 서버를 프로세스 안에서 기동
+  3. 동시 HTTP 부하 생성기로 질문을 보내고 요청/초, 첫 토큰(TTFT)·전체 스트림 시간 p50/p95/p99 출력
+
+  질문은 데이터셋 레코드로 만든 세 종류를 섞음: 단순 지표 조회(직접 응답), 재무 평가(검색+생성), 두 기업 비교.
+  --url을 주면 이미 떠 있는 서버에 부하만 보냄 (실제 모델 측정용).
+
+[사용법]
+  cd models
+  python bench_load.py --requests 300 --concurrency 32 --first-token-ms 300 --tokens-per-sec 50
+  python bench_load.py --url http://localhost:8000 --requests 100 --concurrency 8
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+
+import numpy as np
+import httpx
+
+from metric_store import parse_record_output
+
+
+def build_questions(path, n, seed=0):
+    """데이터셋 레코드 → (직접 조회 / 재무 평가 / 비교) 질문을 섞은 n개"""
+    pairs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            output = parse_record_output(json.loads(line)) if line.strip() else None
+            if output:
+                pairs.append((output["metadata"]["company"], output["metadata"]["fiscal_year"]))
+
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n):
+        company, year = rng.choice(pairs)
+        kind = rng.random()
+        if kind < 0.2:
+            questions.append(f"{company} {year}년 영업이익")
+        elif kind < 0.8:
+            questions.append(f"{company} {year}년 재무 상태 평가해줘")
+        else:
+            other, _ = rng.choice(pairs)
+            questions.append(f"{company}와 {other}의 {year}년 부채비율 비교해줘")
+    return questions
+
+
+def start_local_server(args):
+    """가짜 모델을 주입한 FinanceRAG로 uvicorn을 백그라운드 스레드에서 기동 → base URL"""
+    import os
+    import uvicorn
+
+    import main
+    from answer_cache import SemanticAnswerCache
+    from fake_models import FakeChatModel, FakeEmbeddings
+    from finance_rag import FinanceRAG
+
+    llm = FakeChatModel(first_token_ms=args.first_token_ms, tokens_per_sec=args.tokens_per_sec,
+                        answer_tokens=args.answer_tokens)
+    embeddings = FakeEmbeddings(latency_ms=args.embed_ms, per_text_ms=args.embed_per_text_ms)
+    # 답변 캐시는 기본으로 끔 (같은 질문이 반복되면 파이프라인을 거치지 않으므로)
+    cache = None if args.cache else SemanticAnswerCache(threshold=1.01)
+
+    fresh = not os.path.exists(args.db)
+    rag = FinanceRAG(db_dir=args.db, data_files=(args.data,), answer_cache=cache,
+                     llm=llm, embeddings=embeddings, retriever_backend=args.retriever)
+    if fresh:
+        print(f"🧱 색인 구축: {args.data} → {args.db}")
+        rag.update_data(args.data)
+
+    main.rag = rag
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    for _ in range(200):
+        try:
+            if httpx.get(f"{base_url}/readyz").status_code == 200:
+                return base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("서버가 준비되지 않았습니다.")
+
+
+async def run_load(base_url, questions, concurrency, timeout):
+    queue = asyncio.Queue()
+    for q in questions:
+        queue.put_nowait(q)
+    results = []   # (status, ttft, total)
+
+    async def worker(client):
+        while not queue.empty():
+            question = queue.get_nowait()
+            start = time.perf_counter()
+            ttft = None
+            try:
+                async with client.stream("POST", "/chat/stream", json={"question": question}) as resp:
+                    async for chunk in resp.aiter_raw():
+                        if chunk and ttft is None:
+                            ttft = time.perf_counter() - start
+                    results.append((resp.status_code, ttft, time.perf_counter() - start))
+            except httpx.HTTPError as e:
+                results.append((type(e).__name__, None, time.perf_counter() - start))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def report(results, elapsed):
+    ok = [r for r in results if r[0] == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"\n📊 요청 {len(results)}건 / {elapsed:.2f}s → {len(ok) / elapsed:.1f} req/s (성공 기준)")
+    print(f"   상태: {statuses}")
+    for name, values in (("TTFT", [r[1] for r in ok if r[1] is not None]), ("전체 스트림", [r[2] for r in ok])):
+        if values:
+            p50, p95, p99 = (np.percentile(values, p) * 1000 for p in (50, 95, 99))
+            print(f"   {name:<6} p50 {p50:8.1f}ms | p95 {p95:8.1f}ms | p99 {p99:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat/stream 부하 벤치마크 (가짜 LLM·임베딩)")
+    parser.add_argument("--url", default=None, help="이미 떠 있는 서버 (없으면 가짜 모델로 프로세스 안에서 기동)")
+    parser.add_argument("--data", default="top_30_financial_data.jsonl")
+    parser.add_argument("--db", default="./bench_db", help="벤치마크용 Chroma 폴더 (없으면 구축)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-token-ms", type=float, default=300.0, help="가짜 LLM 첫 토큰 지연")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="가짜 LLM 스트리밍 속도")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="가짜 임베딩 호출당 지연")
+    parser.add_argument("--embed-per-text-ms", type=float, default=1.0, help="가짜 임베딩 텍스트당 지연")
+    parser.add_argument("--retriever", default="chroma", help="검색 백엔드 (chroma | numpy)")
+    parser.add_argument("--cache", action="store_true", help="시맨틱 답변 캐시 사용")
+    args = parser.parse_args()
+
+    base_url = args.url or start_local_server(args)
+    questions = build_questions(args.data, args.requests, args.seed)
+    print(f"🚀 {base_url} ← {len(questions)}건, 동시 {args.concurrency}")
+    results, elapsed = asyncio.run(run_load(base_url, questions, args.concurrency, args.timeout))
+    report(results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
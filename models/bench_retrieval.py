@@ -0,0 +1,84 @@
+"""
+bench_retrieval.py — 벡터 검색 백엔드(Chroma HNSW vs NumPy flat) 지연/재현율 벤치마크
+
+[역할]
+  기존 벡터 DB(finance_local_db)를 그대로 읽어 같은 질문 벡터로 각 백엔드를 검색하고
+  1. 지연: 질문 1건 검색 p50/p95, 배치 검색 시 질문당 평균 (NumPy는 행렬 곱 한 번)
+  2. 재현율: float32 전수 내적 결과를 정답으로 한 recall@k
+  를 출력한다. --filter를 주면 질문의 기업으로 where 필터를 건 검색도 함께 측정.
+
+[사용법]
+  cd models
+  python bench_retrieval.py --db ./finance_local_db --data top_30_financial_data.jsonl --k 5 --queries 200
+"""
+import time
+import random
+import argparse
+
+import numpy as np
+
+from langchain_chroma import Chroma
+
+from bench_embeddings import load_corpus, percentile_ms
+from onnx_embeddings import make_embeddings
+from retrievers import ChromaRetriever, NumpyFlatIndex
+
+
+def recall(results, truth):
+    hits = [len({d.id for d, _ in r} & t) / max(len(t), 1) for r, t in zip(results, truth)]
+    return float(np.mean(hits))
+
+
+def bench(name, retriever, vectors, k, wheres, truth, batch_size):
+    retriever.search(vectors[0], k, wheres[0])  # 워밍업
+
+    latencies, results = [], []
+    for v, w in zip(vectors, wheres):
+        start = time.perf_counter()
+        results.append(retriever.search(v, k, w))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        retriever.search_batch(vectors[i:i + batch_size], k, wheres[i:i + batch_size])
+    batch_ms = (time.perf_counter() - start) / len(vectors) * 1000
+
+    print(f"[{name:<14}] p50 {percentile_ms(latencies, 50):7.3f}ms / p95 {percentile_ms(latencies, 95):7.3f}ms"
+          f" | batch({batch_size}) {batch_ms:7.3f}ms/질문 | recall@{k} {recall(results, truth):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벡터 검색 백엔드 지연·재현율 비교")
+    parser.add_argument("--db", default="./finance_local_db")
+    parser.add_argument("--data", default="top_30_financial_data.jsonl", help="질문을 만들 데이터셋")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--backend", default="hf", help="임베딩 백엔드 (hf | onnx)")
+    parser.add_argument("--filter", action="store_true", help="질문 기업으로 where 필터 적용")
+    args = parser.parse_args()
+
+    _, questions = load_corpus(args.data)
+    random.Random(0).shuffle(questions)
+    questions = questions[:args.queries]
+
+    embeddings = make_embeddings(args.backend)
+    vector_db = Chroma(persist_directory=args.db, embedding_function=embeddings)
+    vectors = embeddings.embed_documents(questions)
+    wheres = [{"company": {"$in": [q.split()[0]]}} if args.filter else None for q in questions]
+
+    chroma = ChromaRetriever(vector_db)
+    flat32 = NumpyFlatIndex.from_chroma(vector_db, dtype="float32")
+    flat16 = NumpyFlatIndex(flat32.matrix.astype(np.float16), flat32.ids, flat32.metadatas(), documents=flat32._documents)
+    print(f"📚 문서 {len(flat32):,}건 / 질문 {len(questions)}건 / 필터 {'on' if args.filter else 'off'}")
+
+    # 정답: float32 전수 내적 top-k
+    truth = [{d.id for d, _ in r} for r in flat32.search_batch(vectors, args.k, wheres)]
+
+    bench("chroma (hnsw)", chroma, vectors, args.k, wheres, truth, args.batch)
+    bench("numpy float32", flat32, vectors, args.k, wheres, truth, args.batch)
+    bench("numpy float16", flat16, vectors, args.k, wheres, truth, args.batch)
+
+
+if __name__ == "__main__":
+    main()
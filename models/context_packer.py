@@ -0,0 +1,128 @@
+"""
+context_packer.py — 검색 문서 → 토큰 예산 안의 압축 표 (grade / generate 프롬프트용)
+
+[역할]
+  검색 문서의 page_content는 데이터셋 레코드 JSON 전체라서, 문서마다 같은 instruction 문장과
+  들여쓰기된 output JSON이 반복된다. 이를 그대로 프롬프트에 넣으면 Gemini 지연과 비용이 커지므로
+  LLM 노드 앞에서 다음 순서로 압축한다.
+  1. 레코드 파싱: instruction / input 같은 학습용 필드는 버리고 (기업, 연도, 지표값)만 남김
+  2. 중복 제거: 같은 (기업, 연도) 또는 같은 본문은 한 번만 (검색 순위가 높은 쪽 유지)
+  3. 관련 범위만: 질문에 나온 지표·연도·기업만 남김 (걸러서 아무것도 안 남으면 전체 유지)
+  4. 표 형태: "기업 | 연도 | 매출액 | 영업이익 ..." 한 줄 한 레코드
+  5. 토큰 예산: 검색 순위대로 행을 넣다가 예산(추정 토큰)을 넘으면 중단 (최소 1행은 유지)
+
+[주요 클래스/함수]
+  - ContextPacker(max_tokens, chars_per_token): pack(question, docs) → 문자열 / stats()
+  - estimate_tokens(text, chars_per_token): 글자 수 기반 토큰 수 추정
+
+[참조하는 곳]
+  - finance_rag.py → node_grade_documents (LLM 평가), node_generate
+"""
+import os
+import json
+
+from metric_store import METRIC_ALIASES, RATIO_METRICS, extract_entities, format_krw, parse_record_output
+from telemetry import Counter
+
+# 한국어 위주 텍스트의 대략적인 글자/토큰 비율 (정확한 토크나이저 대신 예산 판단용)
+CHARS_PER_TOKEN = 2.0
+
+PACK_COUNTERS = ("packed", "raw_tokens", "packed_tokens", "docs_in", "rows_out", "truncated")
+
+
+def estimate_tokens(text, chars_per_token=CHARS_PER_TOKEN):
+    return int(len(text) / chars_per_token) + 1
+
+
+def _parse(doc):
+    """Document → (company, year, {지표: 값}) 또는 레코드가 아니면 None"""
+    try:
+        record = json.loads(doc.page_content)
+    except (ValueError, TypeError):
+        return None
+    output = parse_record_output(record) if isinstance(record, dict) else None
+    if output is None:
+        return None
+    values = {}
+    for section in ("financial_metrics", "analysis_ratios"):
+        for metric, value in (output.get(section) or {}).items():
+            if isinstance(value, (int, float)) and value == value:   # NaN 제외
+                values[metric] = value
+    return output["metadata"]["company"], output["metadata"]["fiscal_year"], values
+
+
+def _format(metric, value):
+    if metric in RATIO_METRICS:
+        return f"{value:g}"
+    return format_krw(value)
+
+
+class ContextPacker:
+    def __init__(self, max_tokens=None, chars_per_token=CHARS_PER_TOKEN):
+        self.max_tokens = max_tokens or int(os.getenv("CONTEXT_TOKEN_BUDGET", 1200))
+        self.chars_per_token = chars_per_token
+        # grade / generate 노드가 여러 스레드에서 동시에 pack을 부르므로 스레드 안전 카운터
+        self.counters = Counter("context_packer", "컨텍스트 패킹 집계 (kind별)")
+
+    def stats(self):
+        counts = self.counters.totals("kind", PACK_COUNTERS)
+        raw = counts["raw_tokens"]
+        return {**counts, "saved_ratio": round(1 - counts["packed_tokens"] / raw, 4) if raw else 0.0}
+
+    def pack(self, question, docs, company_index=None):
+        """company_index: 질문의 기업명 추출용 사전 (build_term_index 결과)"""
+        entities = extract_entities(question, company_index or {})
+
+        # 1~2. 파싱 + 중복 제거 (검색 순위 유지)
+        rows, extras, seen = [], [], set()
+        for doc in docs:
+            parsed = _parse(doc)
+            key = parsed[:2] if parsed else doc.page_content.strip()
+            if key in seen:
+                continue
+            seen.add(key)
+            if parsed:
+                rows.append(parsed)
+            else:
+                extras.append(" ".join(doc.page_content.split()))
+
+        # 3. 질문과 관련된 기업/연도 행, 지표 열만 (걸러서 비면 원래대로)
+        for field, wanted in ((0, entities["companies"]), (1, entities["years"])):
+            filtered = [r for r in rows if r[field] in wanted]
+            if filtered:
+                rows = filtered
+        present = [m for m in METRIC_ALIASES if any(m in r[2] for r in rows)]
+        metrics = [m for m in present if m in entities["metrics"]] or present
+
+        # 4~5. 표 + 토큰 예산
+        header = "기업 | 연도 | " + " | ".join(f"{m}(%)" if m in RATIO_METRICS else m for m in metrics)
+        lines = [header] if rows else []
+        budget = self.max_tokens - (estimate_tokens(header, self.chars_per_token) if rows else 0)
+        truncated = False
+        for company, year, values in rows:
+            line = f"{company} | {year} | " + " | ".join(_format(m, values[m]) if m in values else "-" for m in metrics)
+            cost = estimate_tokens(line, self.chars_per_token)
+            if cost > budget and len(lines) > 1:
+                truncated = True
+                break
+            lines.append(line)
+            budget -= cost
+        for text in extras:
+            cost = estimate_tokens(text, self.chars_per_token)
+            if cost > budget:
+                truncated = True
+                if not lines:
+                    # 레코드가 아닌 문서뿐이면 첫 문서를 예산 길이로 잘라서라도 넣음
+                    lines.append(text[:int(self.max_tokens * self.chars_per_token)])
+                break
+            lines.append(text)
+            budget -= cost
+        packed = "\n".join(lines)
+
+        self.counters.inc(kind="packed")
+        self.counters.inc(len(docs), kind="docs_in")
+        self.counters.inc(len(lines) - (1 if rows else 0), kind="rows_out")
+        self.counters.inc(int(truncated), kind="truncated")
+        self.counters.inc(sum(estimate_tokens(d.page_content, self.chars_per_token) for d in docs), kind="raw_tokens")
+        self.counters.inc(estimate_tokens(packed, self.chars_per_token), kind="packed_tokens")
+        return packed
@@ -2,12 +2,14 @@
 dart_langgraph.py — LangGraph 기반 재무 분석 파이프라인 (실험용, 현재 미사용)
 
 [역할]
-  사용자 질문에서 기업명을 추출(Gemini Flash) → DART에서 재무 데이터 수집
+  사용자 질문에서 기업명을 추출(로컬 매칭, 실패 시 Gemini Flash) → DART에서 재무 데이터 수집
   → 로컬 파인튜닝 모델(Ollama)로 분석 → 결과 검증의 멀티스텝 워크플로우.
 
 [파이프라인 구조]
-  company_extractor (Gemini Flash)
+  company_extractor (corp_matcher → 없으면 Gemini Flash)
     → 기업명 추출 + DART 재무 데이터 수집 (fetch_financials.get_refined_financials)
+      corp_list.csv 기반 Aho-Corasick 매칭(약칭·종목코드·퍼지 보정)으로 corp_code까지 바로 얻고,
+      아무것도 못 찾을 때만 Gemini를 호출 (대부분의 질문에서 네트워크 왕복 1회 절약)
   extractor (Ollama dart_model_v1)
     → 파인튜닝 모델로 8대 재무 지표 추출 및 JSON 생성
   validator
@@ -15,6 +17,8 @@ dart_langgraph.py — LangGraph 기반 재무 분석 파이프라인 (실험용,
 
 [의존]
   - fetch_financials.py (backend/src/tools/) → get_refined_financials()
+  - corp_matcher.py (backend/src/tools/) → CorpMatcher (corp_list.csv 필요, 없으면 항상 Gemini)
+  - metric_store.py → COMPANY_ALIASES (기업 약칭)
   - langchain_ollama, langchain_google_genai, langgraph
   - Ollama에 dart_model_v1 모델이 로컬에 등록되어 있어야 실행 가능
 
@@ -29,6 +33,8 @@ from langchain_ollama import ChatOllama
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
 from fetch_financials import get_refined_financials
+from corp_matcher import CorpMatcher
+from metric_store import COMPANY_ALIASES
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -49,6 +55,8 @@ llm_analyser = ChatOllama(model="dart_model_v1", temperature=0)
 class GraphState(TypedDict):
     user_query: str
     company_name: Optional[str]
+    corp_code: Optional[str]
+    stock_code: Optional[str]
     raw_text: Optional[str]
     financial_data: Optional[dict]
     error_msg: Optional[str]
@@ -58,30 +66,56 @@ class GraphState(TypedDict):
 # 2. 노드 정의
 # ==========================================
 
-def company_extractor_node(state: GraphState):
-    print("--- [NODE] 기업명 추출 (Gemini-Flash) ---")
-    user_query = state["user_query"]
-    
+# [기업명 매칭기] corp_list.csv로 첫 호출 때 한 번만 구축
+_corp_matcher = None
+
+def get_corp_matcher():
+    global _corp_matcher
+    if _corp_matcher is None:
+        try:
+            _corp_matcher = CorpMatcher.from_csv(aliases=COMPANY_ALIASES)
+            print(f"🗂️ 기업명 매칭기 로드: {len(_corp_matcher):,}개 기업")
+        except (OSError, KeyError) as e:
+            print(f"⚠️ corp_list.csv 매칭기 사용 불가 ({e}), Gemini 추출로 대체")
+            _corp_matcher = CorpMatcher([])
+    return _corp_matcher
+
+def extract_company_with_llm(user_query):
+    """로컬 매칭 실패 시에만 사용 (Gemini 호출)"""
     # Gemini는 지시를 매우 잘 따릅니다.
     prompt = f"다음 질문에서 기업 이름만 한 단어로 추출해줘. 다른 말은 절대 하지 마. 없으면 'None'.\n질문: {user_query}"
     
     response = llm_general.invoke(prompt)
     # Gemini 응답에서 기업명만 정제
     company_name = response.content.strip().split('\n')[0].replace('*', '')
-    company_name = re.sub(r'[^\w\s]', '', company_name).split(' ')[0]
+    return re.sub(r'[^\w\s]', '', company_name).split(' ')[0]
+
+def company_extractor_node(state: GraphState):
+    user_query = state["user_query"]
+
+    match = get_corp_matcher().match(user_query)
+    if match:
+        print(f"--- [NODE] 기업명 추출 (로컬 매칭: {match['method']}) ---")
+        company_name, corp_code, stock_code = match["corp_name"], match["corp_code"], match["stock_code"]
+    else:
+        print("--- [NODE] 기업명 추출 (Gemini-Flash) ---")
+        company_name, corp_code, stock_code = extract_company_with_llm(user_query), None, None
     
     print(f"🔍 추출된 기업명: {company_name}")
 
     if company_name == "None" or not company_name:
         return {"error_msg": "기업명을 찾지 못했습니다.", "company_name": "None"}
 
-    # 정제 툴 호출
-    refined_dict = get_refined_financials(company_name, 2025)
+    # 정제 툴 호출 (로컬 매칭이면 corp_code를 넘겨 코드 조회 생략)
+    refined_dict = get_refined_financials(company_name, 2025, corp_code=corp_code)
     if not refined_dict:
-        return {"company_name": company_name, "error_msg": "DART 데이터 로드 실패"}
+        return {"company_name": company_name, "corp_code": corp_code, "stock_code": stock_code,
+                "error_msg": "DART 데이터 로드 실패"}
 
     return {
         "company_name": company_name,
+        "corp_code": corp_code,
+        "stock_code": stock_code,
         "raw_text": json.dumps(refined_dict, ensure_ascii=False, indent=2),
         "error_msg": None
     }
@@ -0,0 +1,144 @@
+"""
+embedding_service.py — 질문 임베딩 마이크로 배처 + LRU 캐시
+
+[역할]
+  동시에 들어온 /chat/stream 요청들이 각자 CPU에서 ko-sroberta forward를 돌리며 서로 경합하지 않도록,
+  짧은 시간창(window_ms) 동안 모인 질문을 한 번의 배치 forward로 임베딩해 각 요청에 돌려준다.
+  최근 질문 임베딩은 LRU로 보관하여 재작성(rewrite) 루프의 재시도나 반복 질문은 모델을 아예 거치지 않는다.
+
+[주요 클래스]
+  - BatchingEmbeddings(base, window_ms, max_batch, cache_size):
+      LangChain Embeddings 인터페이스를 그대로 따르므로 Chroma의 embedding_function으로 바로 사용 가능.
+      - embed_query / aembed_query: 캐시 → 배치 큐 경유
+      - embed_documents: 대량 적재용, 배치 큐·캐시를 거치지 않고 base로 직행
+      - stats(): 캐시 히트/미스, 배치 수, 평균 배치 크기
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG.__init__ (self.embeddings)
+"""
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+
+class BatchingEmbeddings(Embeddings):
+    def __init__(self, base, window_ms=5, max_batch=32, cache_size=1024):
+        self.base = base
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()  # text → vector (LRU 순서)
+        self._cache_lock = threading.Lock()
+
+        self._pending = []           # [(text, Future)]
+        self._cond = threading.Condition()
+        self._worker = None
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+    # --- [LRU 캐시] ---
+
+    def _cache_get(self, text):
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return vector
+
+    def _cache_put(self, text, vector):
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- [배치 워커] ---
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # 첫 요청이 들어온 시점부터 window 동안(또는 max_batch까지) 더 모음
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            # 기다리다 취소된 요청(클라이언트 연결 끊김 등)은 빼고, 남은 Future는 실행 중으로 전환해 더 이상 취소되지 않게 함
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # 같은 배치 안의 중복 질문은 한 번만 임베딩
+            # (어떤 예외든 이 배치의 Future로 전달 — 워커가 죽으면 이후 모든 요청이 멈춤)
+            try:
+                texts = list(dict.fromkeys(text for text, _ in batch))
+                vectors = dict(zip(texts, self.base.embed_documents(texts)))
+                self.batches += 1
+                self.batched_texts += len(texts)
+                for text, vector in vectors.items():
+                    self._cache_put(text, vector)
+                results = [(future, vectors[text]) for text, future in batch]
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for future, vector in results:
+                future.set_result(vector)
+
+    def _submit(self, text):
+        future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future
+
+    # --- [Embeddings 인터페이스] ---
+
+    def embed_query(self, text):
+        vector = self._cache_get(text)
+        if vector is not None:
+            return vector
+        return self._submit(text).result()
+
+    async def aembed_query(self, text):
+        # 이벤트 루프 스레드를 막지 않고, 대기용 스레드도 점유하지 않음
+        vector = self._cache_get(text)
+        if vector is not None:
+            return vector
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def stats(self):
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_size": len(self._cache),
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+        }
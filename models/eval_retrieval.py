@@ -0,0 +1,207 @@
+"""
+eval_retrieval.py — 데이터셋 기반 골든 질문 세트로 1차 검색 품질(recall@k, MRR)과 지연 측정
+
+[역할]
+  k, 임베딩 백엔드, 필터 설정을 감으로 조정하지 않도록, 데이터셋 레코드에서
+  (기업, 연도, 지표) 질문을 만들고 그 레코드를 정답 문서로 삼아 FinanceRAG의 1차 검색
+  (node_retrieve: 기업/연도 필터 + 벡터·BM25 RRF 융합)을 평가한다.
+  1차 검색만으로 정답이 충분히 잡히면 LLM 평가·재검색 루프를 줄일 근거가 된다.
+
+[지표]
+  - recall@1 / recall@3 / recall@k: 정답 레코드가 상위 n개 안에 있는 비율
+      정답은 문서 ID가 아니라 레코드 내용 해시로 맞춤 (예전 ID 규칙으로 적재된 DB도 평가 가능)
+  - MRR: 정답 순위 역수 평균 (k 밖이면 0)
+  - entity@k: 같은 (기업, 연도) 문서가 상위 k개 안에 있는 비율 (정답과 다른 파일의 같은 기업·연도 레코드 포함)
+  - 질문 임베딩 / 검색 지연 p50·p95
+
+  질문은 --seed로 고정되므로, 같은 --seed/--questions로 설정만 바꿔 돌리면 결과를 바로 비교할 수 있다.
+  --out으로 설정과 결과를 JSON으로 남김.
+
+[사용법]
+  cd models
+  python eval_retrieval.py --db ./finance_local_db --questions 300 --k 5 --filters strict,none
+  EMBEDDING_BACKEND=onnx RETRIEVER_BACKEND=numpy python eval_retrieval.py --out onnx_numpy.json
+"""
+import os
+import json
+import time
+import random
+import argparse
+
+from bench_embeddings import percentile_ms
+from metric_store import COMPANY_ALIASES, METRIC_ALIASES, normalize_aliases, parse_record_output
+
+# 같은 (기업, 연도, 지표)를 묻는 여러 표현
+TEMPLATES = (
+    "{company} {year}년 {metric}",
+    "{year}년 {company}의 {metric}은 얼마야?",
+    "{company} {year}년도 {metric} 알려줘",
+    "{company}의 {year}년 {metric} 수준은 어때?",
+)
+
+
+def build_golden_set(paths, n, seed=0, alias_ratio=0.2):
+    """데이터셋 레코드 → [{question, expected_hash, company, year, metric}] (seed 고정)"""
+    # 정식 기업명 → 약칭 (일부 질문은 약칭으로 물음)
+    short_names = {}
+    for alias, name in COMPANY_ALIASES.items():
+        short_names.setdefault(name, []).append(alias)
+
+    from finance_rag import FinanceRAG
+
+    records = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                output = parse_record_output(record)
+                if output is None:
+                    continue
+                present = [m for section in ("financial_metrics", "analysis_ratios")
+                           for m in (output.get(section) or {}) if m in METRIC_ALIASES]
+                if present:
+                    records.append((FinanceRAG._record_id(record), output["metadata"], present))
+
+    rng = random.Random(seed)
+    golden = []
+    for content_hash, meta, present in rng.sample(records, min(n, len(records))):
+        metric = rng.choice(present)
+        company = meta["company"]
+        if company in short_names and rng.random() < alias_ratio:
+            company = rng.choice(short_names[company])
+        question = rng.choice(TEMPLATES).format(
+            company=company, year=meta["fiscal_year"], metric=rng.choice(METRIC_ALIASES[metric]))
+        golden.append({"question": question, "expected_hash": content_hash, "company": meta["company"],
+                       "year": meta["fiscal_year"], "metric": metric})
+    return golden
+
+
+def doc_hash(doc):
+    """문서의 레코드 내용 해시: 메타데이터 content_hash, 없으면 본문(레코드 JSON)에서 계산"""
+    content_hash = (doc.metadata or {}).get("content_hash")
+    if content_hash:
+        return content_hash
+    try:
+        record = json.loads(doc.page_content)
+    except (TypeError, ValueError):
+        return None
+    from finance_rag import FinanceRAG
+    return FinanceRAG._record_id(record) if isinstance(record, dict) else None
+
+
+def indexed_hashes(rag):
+    """검색 대상에 들어 있는 레코드 해시 (해시 메타데이터가 없는 문서는 본문에서 계산, 예: 보강 전에 내보낸 스냅샷)"""
+    metadatas = rag.retriever.metadatas()
+    hashes = {m["content_hash"] for m in metadatas if m and m.get("content_hash")}
+    legacy = [i for i, m in zip(getattr(rag.retriever, "ids", ()), metadatas) if not (m or {}).get("content_hash")]
+    hashes.update(h for h in map(doc_hash, rag.retriever.get_by_ids(legacy) if legacy else ()) if h)
+    return hashes
+
+
+def embed_questions(rag, golden):
+    """질문 임베딩 (지연 측정 포함). 필터 수준별 평가는 같은 벡터를 재사용 (LRU 캐시 히트로 지연이 왜곡되지 않게)
+    node_route처럼 약칭을 정규화한 질문을 임베딩"""
+    vectors, embed_s = [], []
+    for item in golden:
+        start = time.perf_counter()
+        vectors.append(rag.embeddings.embed_query(normalize_aliases(item["question"], rag.alias_index)))
+        embed_s.append(time.perf_counter() - start)
+    return vectors, {"embed_p50_ms": round(percentile_ms(embed_s, 50), 2),
+                     "embed_p95_ms": round(percentile_ms(embed_s, 95), 2)}
+
+
+def evaluate(rag, golden, vectors, k, filter_level):
+    """filter_level별 1차 검색 결과 → 지표 dict"""
+    ranks, entity_hits, search_s = [], 0, []
+    for item, vector in zip(golden, vectors):
+        query = normalize_aliases(item["question"], rag.alias_index)
+        search = {"query": query, "k": k, "filter": filter_level, "split": False}
+        start = time.perf_counter()
+        state = rag.node_retrieve({"question": query, "query_vector": vector, "search": search})
+        search_s.append(time.perf_counter() - start)
+
+        docs = state["context"][:k]
+        hashes = [doc_hash(doc) for doc in docs]
+        ranks.append(hashes.index(item["expected_hash"]) + 1 if item["expected_hash"] in hashes else None)
+        entity_hits += any(d.metadata.get("company") == item["company"] and d.metadata.get("fiscal_year") == item["year"]
+                           for d in docs)
+
+    n = len(golden)
+    recall = lambda top: round(sum(1 for r in ranks if r is not None and r <= top) / n, 4)
+    return {
+        "filter": filter_level,
+        "recall@1": recall(1),
+        "recall@3": recall(min(3, k)),
+        f"recall@{k}": recall(k),
+        "mrr": round(sum(1 / r for r in ranks if r is not None) / n, 4),
+        f"entity@{k}": round(entity_hits / n, 4),
+        "search_p50_ms": round(percentile_ms(search_s, 50), 2),
+        "search_p95_ms": round(percentile_ms(search_s, 95), 2),
+        "misses": [item["question"] for item, r in zip(golden, ranks) if r is None][:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="골든 질문 세트로 1차 검색 recall@k / MRR / 지연 평가")
+    parser.add_argument("--db", default="./finance_local_db")
+    parser.add_argument("--data", default="top_30_financial_data.jsonl,dart_financial_analysis_dataset.jsonl",
+                        help="질문을 만들 데이터셋 (쉼표 구분, 없는 파일은 건너뜀)")
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--filters", default="strict,none", help="비교할 필터 수준 (strict | company | none)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="fake_models.FakeEmbeddings 사용 (같은 가짜 임베딩으로 만든 DB 전용, 예: bench_load.py의 bench_db)")
+    parser.add_argument("--out", default=None, help="설정과 결과를 저장할 JSON 경로")
+    args = parser.parse_args()
+
+    from fake_models import FakeChatModel, FakeEmbeddings
+    from finance_rag import FinanceRAG
+
+    paths = [p for p in args.data.split(",") if p]
+    # 검색만 평가하므로 LLM은 호출되지 않음 (Gemini 키 없이 실행)
+    rag = FinanceRAG(db_dir=args.db, data_files=tuple(paths), llm=FakeChatModel(),
+                     embeddings=FakeEmbeddings() if args.fake_embeddings else None)
+
+    golden = build_golden_set(paths, args.questions, args.seed)
+    indexed = indexed_hashes(rag)
+    skipped = sum(g["expected_hash"] not in indexed for g in golden)
+    golden = [g for g in golden if g["expected_hash"] in indexed]
+    if not golden:
+        raise SystemExit("❌ 정답 레코드가 벡터 DB에 하나도 없습니다. --db / --data를 확인하세요.")
+    rag.warmup([golden[0]["question"]])
+
+    config = {
+        "db": args.db, "data": paths, "questions": len(golden), "skipped_not_indexed": skipped,
+        "k": args.k, "seed": args.seed,
+        "embedding_backend": "fake" if args.fake_embeddings else os.getenv("EMBEDDING_BACKEND", "hf"),
+        "retriever_backend": "snapshot" if rag.snapshot else os.getenv("RETRIEVER_BACKEND", "chroma"),
+    }
+    print(f"🧪 골든 질문 {len(golden)}건 (색인되지 않은 정답 {skipped}건 제외) | {config}")
+    vectors, embed_latency = embed_questions(rag, golden)
+    config.update(embed_latency)
+    print(f"   질문 임베딩 p50 {embed_latency['embed_p50_ms']:.2f}ms / p95 {embed_latency['embed_p95_ms']:.2f}ms")
+
+    results = []
+    for level in [f.strip() for f in args.filters.split(",") if f.strip()]:
+        result = evaluate(rag, golden, vectors, args.k, level)
+        results.append(result)
+        print(f"\n📊 filter={level:<8} recall@1 {result['recall@1']:.3f} | recall@3 {result['recall@3']:.3f} | "
+              f"recall@{args.k} {result[f'recall@{args.k}']:.3f} | MRR {result['mrr']:.3f} | "
+              f"entity@{args.k} {result[f'entity@{args.k}']:.3f}")
+        print(f"   검색 p50 {result['search_p50_ms']:.2f}ms / p95 {result['search_p95_ms']:.2f}ms")
+        for question in result["misses"][:3]:
+            print(f"   ❌ 놓친 질문 예: {question}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 결과 저장: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+fake_models.py — 네트워크/GPU 없이 쓰는 결정적(deterministic) 가짜 임베딩·채팅 모델 (벤치마크용)
+
+[역할]
+  Gemini 쿼터와 임베딩 모델 없이 /chat/stream 처리량과 꼬리 지연을 재기 위해
+  FinanceRAG(llm=..., embeddings=...)에 주입하는 대체 모델.
+  - FakeEmbeddings: 글자 2-gram 해시 → 고정 차원 벡터 (같은 텍스트 = 같은 벡터, 비슷한 텍스트 = 가까운 벡터)
+      지연: 호출당 latency_ms + 텍스트당 per_text_ms (배치 효과가 보이도록)
+  - FakeChatModel: 적합성 평가 프롬프트에는 "yes", 답변 프롬프트에는 [데이터] 표 일부를 인용한 고정 형식 답변
+      지연: 첫 토큰까지 first_token_ms, 이후 tokens_per_sec 속도로 스트리밍
+
+[참조하는 곳]
+  - bench_load.py → 부하 벤치마크
+"""
+import time
+import asyncio
+import hashlib
+from typing import Any, Iterator, AsyncIterator, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, dim=256, latency_ms=0.0, per_text_ms=0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+
+    def _vector(self, text):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for i in range(len(text) - 1):
+            h = int.from_bytes(hashlib.blake2b(text[i:i + 2].encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0
+        norm = float(np.linalg.norm(v))
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep((self.latency_ms + self.per_text_ms * len(texts)) / 1000)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    first_token_ms: float = 300.0
+    tokens_per_sec: float = 50.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-finance-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = messages[-1].content if messages else ""
+        if "'yes' 또는 'no'" in prompt:
+            return ["yes"]
+        # [데이터] 표의 행을 인용해 답변 길이(answer_tokens)만큼 단어를 만든다
+        rows = [line for line in prompt.splitlines() if " | " in line][1:] or ["데이터 없음"]
+        words = ["분석", "결과:"] + " ".join(rows).split()
+        while len(words) < self.answer_tokens:
+            words += words
+        return [w + " " for w in words[:self.answer_tokens]]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._reply(messages)
+        time.sleep((self.first_token_ms + 1000 * (len(tokens) - 1) / self.tokens_per_sec) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for i, token in enumerate(self._reply(messages)):
+            if i:
+                time.sleep(1 / self.tokens_per_sec)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        tokens = self._reply(messages)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_sec)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -1,11 +1,17 @@
 import os
+import re
 import json
+import time
+import hashlib
 import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
 from typing import List, TypedDict
 from tqdm import tqdm
 from dotenv import load_dotenv
 
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
@@ -15,6 +21,20 @@ from langchain_core.output_parsers import StrOutputParser
 # LangGraph 관련 임포트
 from langgraph.graph import StateGraph, END
 
+from metric_store import (MetricStore, build_alias_index, build_term_index, extract_entities, load_company_names,
+                          normalize_aliases, parse_record_output)
+from answer_cache import SemanticAnswerCache
+from admission import AdmissionController, Overloaded, StageTimeout
+from single_flight import SingleFlight
+from context_packer import ContextPacker
+from telemetry import Counter, Telemetry
+from embedding_service import BatchingEmbeddings
+from onnx_embeddings import make_embeddings
+from grader import RuleBasedGrader
+from lexical_index import NgramBM25Index, reciprocal_rank_fusion
+from retrievers import make_retriever
+from vector_snapshot import VectorSnapshot
+
 # 1. 상태(State) 정의: 노드 간에 전달될 데이터 구조
 class AgentState(TypedDict):
     question: str
@@ -22,57 +42,546 @@ class AgentState(TypedDict):
     answer: str
     retry_count: int
     relevance: str  # <--- 이 줄이 반드시 있어야 합니다!
+    route: str      # "direct": 지표 저장소에서 바로 답변 / "search": 검색 파이프라인
+    query_vector: List[float]  # query_stream에서 한 번 계산한 질문 임베딩 (캐시 조회·검색에 재사용)
+    distances: List[float]     # context 각 문서의 코사인 거리 (규칙 평가용, 계산 불가 시 None)
+    grade_path: str            # 적합성 판정 경로: "rule" (로컬 규칙) / "llm" (Gemini)
+    search: dict               # 현재 검색 조건 {"query", "k", "filter": strict|company|none, "split"}
+    entities: dict             # route에서 약칭을 정규화한 질문의 기업/연도/지표 (직접 조회·1차 검색 필터에 재사용)
+    search_key: str            # 실제 실행된 검색 조건의 키 (재시도 시 중복 판별용)
+    tried: List[str]           # 이번 실행에서 이미 시도한 search_key 목록
+    retrieval_memo: dict       # (쿼리, k, 필터) → 검색 결과. 같은 검색은 다시 실행하지 않음
+    grade_memo: dict           # (쿼리, 문서 묶음) → 평가 결과. 같은 문서 묶음은 다시 평가하지 않음
+
+# 노드 진행 로그 (기본은 출력 안 함, LOG_LEVEL=DEBUG로 확인)
+log = logging.getLogger("stock_agent.rag")
+
+# 현재 그래프 실행의 취소 상태 {"cancel": threading.Event, "generation_started": bool}
+# 노드는 복사된 contextvars 안에서 실행되므로 스레드 풀의 동기 노드에서도 같은 객체를 봄
+_current_run = contextvars.ContextVar("current_run", default=None)
+
+# 지표 저장소를 구축할 데이터셋 (없는 파일은 건너뜀)
+DEFAULT_DATA_FILES = ("./top_30_financial_data.jsonl", "./dart_financial_analysis_dataset.jsonl")
+
+# 약칭 치환 시 함께 넣을 상장사 이름 목록 (없으면 색인된 기업명만 사용, CORP_LIST_PATH로 변경)
+DEFAULT_CORP_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "data", "raw", "corp_list.csv")
 
 class FinanceRAG:
-    def __init__(self, db_dir="./finance_local_db"):
+    def __init__(self, db_dir="./finance_local_db", data_files=DEFAULT_DATA_FILES, answer_cache=None,
+                 embed_window_ms=5, embed_max_batch=32, embed_cache_size=1024,
+                 embedding_backend=None, snapshot_dir=None, retriever_backend=None, admission=None,
+                 telemetry=None, llm=None, embeddings=None):
         load_dotenv()
         self.db_dir = db_dir
-        self.embeddings = HuggingFaceEmbeddings(model_name="jhgan/ko-sroberta-multitask", model_kwargs={'device': 'cpu'})
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", temperature=0)
+        # 읽기 전용 mmap 스냅샷 (vector_snapshot.py로 내보냄). 지정하면 검색은 스냅샷에서 하고
+        # Chroma는 update_data 등 쓰기가 필요할 때만 연다 → 멀티 워커가 같은 페이지 캐시를 공유
+        self.snapshot_dir = snapshot_dir or os.getenv("VECTOR_SNAPSHOT_DIR") or None
+        self.snapshot = None
+        self._vector_db = None
+        # 단계별 지연 히스토그램 / 카운터 (/metrics)
+        self.telemetry = telemetry or Telemetry()
+        # 구성 요소별 초기화 시간 (초). 서버 기동 시간 회귀 추적용 (/readyz에서 확인)
+        self.init_timings = {}
+
+        # 임베딩 백엔드: "hf" (PyTorch fp32) / "onnx" (ONNX int8, bench_embeddings.py로 정합성 확인)
+        # 동시 요청의 질문 임베딩은 짧은 시간창 단위로 묶어 한 번에 forward (+ 최근 질문 LRU 캐시)
+        # (llm / embeddings를 넘기면 그대로 사용 — 벤치마크에서 fake_models 주입용)
+        with self._timed("embeddings"):
+            self.embeddings = BatchingEmbeddings(
+                embeddings or make_embeddings(embedding_backend or os.getenv("EMBEDDING_BACKEND", "hf")),
+                window_ms=embed_window_ms, max_batch=embed_max_batch, cache_size=embed_cache_size,
+            )
+        with self._timed("llm"):
+            self.llm = llm or ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", temperature=0)
         
-        # 벡터 DB 로드
-        self.vector_db = Chroma(persist_directory=self.db_dir, embedding_function=self.embeddings)
+        # 벡터 DB 로드 (새로 만드는 컬렉션은 코사인 거리 사용 → 규칙 평가기의 거리 점수에 활용)
+        # 검색 백엔드: "chroma" (기존) / "numpy" (저장된 임베딩을 정규화 행렬로 메모리에 올려 내적 + argpartition)
+        with self._timed("vector_db"):
+            if self.snapshot_dir:
+                self.snapshot = VectorSnapshot.open(self.snapshot_dir)
+                self.retriever = self.snapshot.index
+                print(f"🗺️ [Snapshot] {self.snapshot_dir} ({len(self.snapshot):,}건, {self.snapshot.manifest['dtype']})")
+            else:
+                backend = retriever_backend or os.getenv("RETRIEVER_BACKEND", "chroma")
+                self.retriever = make_retriever(backend, self.vector_db, dtype=os.getenv("RETRIEVER_DTYPE", "float32"))
+            self._cosine_distance = self.retriever.cosine_distance
+            if self.snapshot is None:
+                self._migrate_legacy_metadata()
+
+        # 문자 n-gram BM25 역색인 (벡터 검색과 RRF로 융합). 벡터 DB 폴더(또는 스냅샷) 안에 함께 저장
+        with self._timed("lexical_index"):
+            self.lexical_path = os.path.join(self.snapshot_dir or self.db_dir, "lexical_index.pkl")
+            self.lexical_index = self._load_lexical_index()
+
+        # update_data 진행 위치 (파일별 읽은 바이트 수)
+        self.checkpoint_path = os.path.join(self.db_dir, "ingest_checkpoint.json")
+
+        # 검색 문서 적합성 규칙 평가기 (애매할 때만 LLM 호출)
+        self.grader = RuleBasedGrader()
+
+        # (기업, 연도, 지표) 직접 조회용 저장소
+        with self._timed("metric_store"):
+            self.metric_store = MetricStore.from_jsonl(data_files)
+
+        # 검색 필터용 기업명 사전 (벡터 DB에 색인된 company 메타데이터 기준)
+        # 약칭 치환 사전에는 상장사 이름 전체도 넣어, '현대차증권' 같은 실제 기업명을 약칭으로 오인하지 않게 함
+        with self._timed("company_index"):
+            self.listed_companies = load_company_names(os.getenv("CORP_LIST_PATH", DEFAULT_CORP_LIST))
+            self._refresh_company_index()
+
+        # 표현만 다른 반복 질문용 답변 캐시 (임계값/TTL/용량은 SemanticAnswerCache 인자로 조정)
+        self.answer_cache = answer_cache or SemanticAnswerCache()
         
+        # LLM 프롬프트용 문서 압축 (중복 제거 + 관련 지표·연도만 표로 + 토큰 예산)
+        self.context_packer = ContextPacker()
+
+        # 동시 실행/LLM 호출 상한, 대기열, 노드별 타임아웃, 동기 노드 전용 스레드 풀
+        self.admission = admission or AdmissionController()
+        # 같은 질문이 동시에 들어오면 실행 하나에 합류시켜 토큰을 나눠 받음
+        self.single_flight = SingleFlight()
+        # 클라이언트 연결 끊김으로 취소된 요청/실행 수와 그 덕분에 하지 않은 LLM 호출 수
+        # (노드 스레드와 이벤트 루프에서 함께 올리므로 스레드 안전 카운터)
+        self.cancel_counters = Counter("cancel", "연결 끊김 취소 집계 (kind별)")
+
         # 2. 그래프 구축
-        self.app = self._build_graph()
+        with self._timed("graph"):
+            self.app = self._build_graph()
+
+        # 구성 요소별 stats()를 /metrics 게이지로 함께 노출
+        for prefix, stats in (("answer_cache", self.answer_cache.stats), ("grader", self.grader.stats),
+                              ("admission", self.admission.stats), ("coalesce", self.single_flight.stats),
+                              ("cancel", self.cancel_stats), ("context_packer", self.context_packer.stats),
+                              ("embeddings", self.embeddings.stats)):
+            self.telemetry.add_collector(prefix, stats)
+
+    @property
+    def vector_db(self):
+        # 스냅샷 모드에서는 쓰기(update_data)가 필요할 때 처음 열림
+        if self._vector_db is None:
+            self._vector_db = Chroma(persist_directory=self.db_dir, embedding_function=self.embeddings,
+                                     collection_metadata={"hnsw:space": "cosine"})
+        return self._vector_db
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        yield
+        self.init_timings[name] = round(time.perf_counter() - start, 4)
+
+    def cancel_stats(self):
+        """연결 끊김으로 취소된 요청/실행 수, 취소로 하지 않은 LLM 호출 수"""
+        return self.cancel_counters.totals("kind", ("cancelled_requests", "cancelled_runs", "llm_calls_avoided"))
+
+    def warmup(self, queries):
+        """
+        첫 실제 요청이 치르던 콜드 스타트 비용을 기동 시점에 미리 지불한다.
+        (토크나이저 초기화·첫 forward, 배치 워커 스레드 기동, HNSW 인덱스 페이지 인, BM25 가중치 계산)
+        반환: 단계별 소요 시간 (초)
+        """
+        timings = {}
+        start = time.perf_counter()
+        vectors = [self.embeddings.embed_query(q) for q in queries]
+        timings["warmup_embed"] = round(time.perf_counter() - start, 4)
+
+        start = time.perf_counter()
+        self.retriever.search_batch(vectors, k=1)
+        for q in queries:
+            self.lexical_index.search(q, k=1)
+        timings["warmup_search"] = round(time.perf_counter() - start, 4)
+
+        self.init_timings.update(timings)
+        return timings
+
+    # --- [데이터 적재 / 검색 필터] ---
+
+    def _record_to_document(self, record, source):
+        """데이터셋 레코드 → Document. 기업명/회계연도는 필터 검색용, 내용 해시는 중복 판별용 메타데이터로 저장"""
+        metadata = {"source": source, "content_hash": self._record_id(record)}
+        output = parse_record_output(record)
+        if output is not None:
+            metadata.update(output["metadata"])
+        return Document(page_content=json.dumps(record, ensure_ascii=False), metadata=metadata)
+
+    @staticmethod
+    def _record_id(record):
+        """레코드 내용 해시 → 안정적인 문서 ID (같은 레코드는 몇 번 적재해도 같은 ID)"""
+        canonical = json.dumps(record, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+    def _migrate_legacy_metadata(self, batch_size=1000):
+        """
+        내용 해시를 ID로 쓰기 전에 적재된 문서에 content_hash / company / fiscal_year 메타데이터를 채운다.
+        (없으면 update_data가 ID만으로 중복을 못 거르고, 기업/연도 필터 검색이 항상 빈 결과 → 전체 검색으로 대체됨)
+        메타데이터만 갱신하므로 재임베딩은 없고, 한 번 채운 뒤에는 메타데이터 조회 한 번으로 끝난다.
+        """
+        data = self.vector_db.get(include=["metadatas"])
+        legacy = [i for i, m in zip(data["ids"], data["metadatas"]) if not (m or {}).get("content_hash")]
+        migrated = 0
+        for start in range(0, len(legacy), batch_size):
+            batch = self.vector_db.get(ids=legacy[start:start + batch_size], include=["documents", "metadatas"])
+            ids, metadatas = [], []
+            for doc_id, content, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                try:
+                    record = json.loads(content)
+                except (TypeError, ValueError):
+                    continue   # 레코드가 아닌 문서는 그대로
+                if not isinstance(record, dict):
+                    continue
+                metadata = {**(metadata or {}), "content_hash": self._record_id(record)}
+                output = parse_record_output(record)
+                if output is not None:
+                    metadata.update(output["metadata"])
+                ids.append(doc_id)
+                metadatas.append(metadata)
+            if ids:
+                self.vector_db._collection.update(ids=ids, metadatas=metadatas)
+                self.retriever.update_metadatas(ids, metadatas)
+                migrated += len(ids)
+        if migrated:
+            print(f"🧩 [Migrate] 예전 문서 {migrated:,}건에 내용 해시·기업/연도 메타데이터 보강")
+
+    def _existing_content(self):
+        """컬렉션의 (문서 ID 집합, 내용 해시 집합). 예전 ID로 적재된 문서도 _migrate_legacy_metadata가 해시를 채워 둠"""
+        data = self.vector_db.get(include=["metadatas"])
+        hashes = {m["content_hash"] for m in data["metadatas"] if m and m.get("content_hash")}
+        return set(data["ids"]), hashes
+
+    def _load_checkpoints(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_checkpoints(self, checkpoints):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(checkpoints, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.checkpoint_path)
+
+    @staticmethod
+    def _is_line_boundary(file_path, offset):
+        with open(file_path, 'rb') as f:
+            f.seek(offset - 1)
+            return f.read(1) == b'\n'
+
+    def _read_batches(self, file_path, start, batch_size):
+        """JSONL을 start 바이트 위치부터 스트리밍으로 읽어 (레코드 목록, 배치 끝 위치) 단위로 반환"""
+        batch = []
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            for line in iter(f.readline, b''):
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    yield batch, f.tell()
+                    batch = []
+            if batch:
+                yield batch, f.tell()
+
+    def update_data(self, file_path, batch_size=512):
+        """
+        JSONL 데이터셋을 증분 적재한다.
+        - 레코드 내용 해시를 ID로 써서 이미 컬렉션에 있는 레코드는 임베딩하지 않고 건너뜀
+          (예전 ID 규칙으로 적재된 문서는 기동 시 _migrate_legacy_metadata가 채운 content_hash로 비교)
+        - 새 레코드는 batch_size 단위로 한 번에 임베딩하여 upsert
+        - 배치마다 읽은 위치를 체크포인트로 남겨, 중단 후 다시 실행하면 그 위치부터 이어서 진행
+        """
+        if self.snapshot is not None:
+            # 스냅샷은 불변. 적재는 스냅샷 없이 띄운 프로세스에서 하고 vector_snapshot.py로 다시 내보낸다
+            raise RuntimeError("스냅샷 모드에서는 update_data를 쓸 수 없습니다 (snapshot_dir 없이 적재 후 다시 내보내기)")
+        key = os.path.abspath(file_path)
+        size = os.path.getsize(file_path)
+        checkpoints = self._load_checkpoints()
+        progress = checkpoints.get(key, {})
+
+        # 파일이 줄었거나 체크포인트가 줄 경계가 아니면(파일이 바뀜) 처음부터.
+        # 내용 해시로 중복을 거르므로 다시 읽어도 재임베딩은 없음
+        start = progress.get("offset", 0)
+        if start > size or (start and not self._is_line_boundary(file_path, start)):
+            start, progress = 0, {}
+        if start == size and progress.get("size") == size:
+            print(f"⏭️ {file_path}: 이미 모두 적재됨 (체크포인트)")
+            return {"read": 0, "added": 0, "skipped": 0}
+        if start:
+            print(f"🔄 {file_path}: 체크포인트 {start:,} / {size:,} 바이트부터 이어서 적재")
+
+        stats = {"read": 0, "added": 0, "skipped": 0}
+        seen = set()
+        known_ids, known_hashes = self._existing_content()
+        source = os.path.basename(file_path)
+        with tqdm(total=size, initial=start, unit="B", unit_scale=True, desc="🧠 임베딩") as bar:
+            for records, offset in self._read_batches(file_path, start, batch_size):
+                ids, docs = [], []
+                for record in records:
+                    doc_id = self._record_id(record)
+                    if doc_id in seen:
+                        continue
+                    seen.add(doc_id)
+                    ids.append(doc_id)
+                    docs.append(self._record_to_document(record, source=source))
+                    self.metric_store.add_record(record)
+
+                new = [(i, d) for i, d in zip(ids, docs) if i not in known_ids and i not in known_hashes]
+                if new:
+                    self.vector_db.add_documents([d for _, d in new], ids=[i for i, _ in new])
+                    self.retriever.refresh([i for i, _ in new])
+                    known_ids.update(i for i, _ in new)
+                    known_hashes.update(i for i, _ in new)
+                # 이전 실행에서 벡터 DB에만 들어가고 역색인 저장 전에 멈춘 문서도 함께 반영 (이미 있으면 무시됨).
+                # 예전 ID로 들어가 있는 레코드는 새 ID로 역색인에 넣지 않음 (벡터 DB에 없는 ID가 생김)
+                indexed = [(i, d) for i, d in zip(ids, docs) if i in known_ids]
+                self.lexical_index.add([i for i, _ in indexed], [d for _, d in indexed])
+                self.lexical_index.save(self.lexical_path)
+
+                stats["read"] += len(records)
+                stats["added"] += len(new)
+                stats["skipped"] += len(records) - len(new)
+
+                checkpoints[key] = {"offset": offset, "size": size, **{k: progress.get(k, 0) + v for k, v in stats.items()}}
+                self._save_checkpoints(checkpoints)
+                bar.update(offset - bar.n)
+
+        if stats["added"]:
+            self._refresh_company_index()
+            self.answer_cache.invalidate()
+        print(f"✅ {file_path}: {stats['read']}건 읽음 / 신규 {stats['added']}건 적재 / 중복 {stats['skipped']}건 건너뜀")
+        return stats
+
+    def ingest_local_json(self, file_path, batch_size=512):
+        """JSONL 데이터셋을 로컬 CPU로 임베딩하여 벡터 DB에 저장 (update_data와 동일, 기존 이름 유지)"""
+        return self.update_data(file_path, batch_size)
+
+    def _load_lexical_index(self):
+        if os.path.exists(self.lexical_path):
+            return NgramBM25Index.load(self.lexical_path)
+        if self.snapshot is not None:
+            raise FileNotFoundError(f"스냅샷에 BM25 역색인이 없습니다: {self.lexical_path}")
+
+        # 역색인이 없는 기존 DB는 컬렉션 내용으로 한 번 만들어 저장
+        index = NgramBM25Index()
+        data = self.vector_db.get(include=["documents", "metadatas"])
+        if data["ids"]:
+            docs = [Document(page_content=c, metadata=m or {}) for c, m in zip(data["documents"], data["metadatas"])]
+            index.add(data["ids"], docs)
+            index.save(self.lexical_path)
+            print(f"🔤 [Lexical] 기존 컬렉션으로 BM25 역색인 생성: {len(index)}건")
+        return index
+
+    def _refresh_company_index(self):
+        metadatas = self.retriever.metadatas()
+        self.indexed_companies = sorted({m["company"] for m in metadatas if m and m.get("company")})
+        # 지표 저장소에만 있는 기업도 잡도록 합침 (필터에 걸리는 문서가 없으면 _search가 전체 검색으로 대체)
+        self.company_index = build_term_index(set(self.indexed_companies) | set(self.metric_store.companies))
+        self.alias_index = build_alias_index(set(self.indexed_companies) | set(self.metric_store.companies)
+                                             | set(self.listed_companies))
+
+    def _build_where(self, entities, level="strict"):
+        """
+        추출된 기업/연도 → Chroma where 필터 (둘 다 없으면 None)
+        level: "strict" 기업+연도 / "company" 기업만 (연도 완화) / "none" 필터 없음
+        """
+        conditions = []
+        if level == "none":
+            return None
+        if entities["companies"]:
+            conditions.append({"company": {"$in": entities["companies"]}})
+        if entities["years"] and level == "strict":
+            conditions.append({"fiscal_year": {"$in": entities["years"]}})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def _stage(self, stage, node):
+        """노드 실행 래퍼: 동기 노드는 전용 스레드 풀에서 (contextvars 유지), stage 타임아웃 적용"""
+        if asyncio.iscoroutinefunction(node):
+            async def run(state: AgentState):
+                with self.telemetry.span(f"node_{stage}"):
+                    return await self.admission.run_stage(stage, node, state)
+        else:
+            async def run(state: AgentState):
+                ctx = contextvars.copy_context()
+                with self.telemetry.span(f"node_{stage}"):
+                    return await self.admission.run_stage(stage, ctx.run, node, state)
+        return run
 
     def _build_graph(self):
         workflow = StateGraph(AgentState)
 
         # 1. 노드 정의: 각 단계의 역할 지정
-        workflow.add_node("retrieve", self.node_retrieve)               # RAG: 질문 관련 문서 검색
-        workflow.add_node("grade_documents", self.node_grade_documents) # QC: 검색된 문서의 적합성 평가
-        workflow.add_node("generate", self.node_generate)               # 최종 답변 생성
+        # (각 노드는 _stage로 감싸 전용 스레드 풀 + 단계별 타임아웃 적용)
+        workflow.add_node("route", self._stage("route", self.node_route))                          # 단순 지표 조회는 저장소에서 바로 답변
+        workflow.add_node("retrieve", self._stage("retrieve", self.node_retrieve))                 # RAG: 질문 관련 문서 검색
+        workflow.add_node("grade_documents", self._stage("grade", self.node_grade_documents))      # QC: 검색된 문서의 적합성 평가
+        workflow.add_node("transform_query", self._stage("transform", self.node_transform_query))  # 재검색 조건 변환 (별칭/k/필터/분할)
+        workflow.add_node("generate", self._stage("generate", self.node_generate))                 # 최종 답변 생성
 
-        # 2. 기본 엣지: 검색이 끝나면 무조건 평가 단계로 이동
-        workflow.set_entry_point("retrieve")
+        # 2. 라우팅: 저장소에서 답을 찾으면 바로 종료, 아니면 검색 파이프라인으로
+        workflow.set_entry_point("route")
+        workflow.add_conditional_edges(
+            "route",
+            self.decide_route,
+            {
+                "direct": END,        # 직접 조회 성공
+                "search": "retrieve"  # 해석 불가: 기존 파이프라인
+            }
+        )
+
+        # 3. 기본 엣지: 검색이 끝나면 무조건 평가 단계로 이동
         workflow.add_edge("retrieve", "grade_documents")
         
-        # 3. 조건부 엣지: 평가 결과(relevance)에 따른 분기 처리
+        # 4. 조건부 엣지: 평가 결과(relevance)에 따른 분기 처리
         workflow.add_conditional_edges(
             "grade_documents",
             self.decide_to_generate,
             {
                 "generate": "generate", # 적합: 답변 생성으로 이동
-                "rewrite": "retrieve",  # 부적합: 검색 쿼리 재조정 후 다시 검색
+                "rewrite": "transform_query",  # 부적합: 검색 조건을 바꿔서 다시 검색
                 "end": END              # 실패: 재시도 횟수 초과 시 종료
             }
         )
+
+        # 5. 재검색: 아직 시도하지 않은 검색 조건이 남아 있을 때만 retrieve로
+        workflow.add_conditional_edges(
+            "transform_query",
+            self.decide_after_transform,
+            {
+                "retrieve": "retrieve",
+                "end": END              # 바꿔볼 조건이 더 없음
+            }
+        )
         
-        # 4. 종료 엣지: 답변 생성이 완료되면 끝
+        # 6. 종료 엣지: 답변 생성이 완료되면 끝
         workflow.add_edge("generate", END)
 
         return workflow.compile()
 
     # --- [노드 함수들] ---
 
+    def node_route(self, state: AgentState):
+        # 약칭은 여기서 한 번만 정규화 ('삼전' → '삼성전자'): 직접 조회와 1차 검색 필터가 같은 엔티티를 씀
+        query = normalize_aliases(state["question"], self.alias_index)
+        entities = extract_entities(query, self.company_index)
+        answer = self.metric_store.resolve(query, entities)
+        if answer is None:
+            return {"route": "search", "search": self._initial_search(query), "entities": entities}
+        log.debug("⚡ [Node: Route] 지표 저장소에서 바로 답변 (검색/LLM 생략)")
+        return {"route": "direct", "answer": answer, "relevance": "yes"}
+
+    def decide_route(self, state: AgentState):
+        return state.get("route", "search")
+
+    def _initial_search(self, question):
+        return {"query": question, "k": 5, "filter": "strict", "split": False}
+
+    def _plan_search(self, search, entities=None):
+        """검색 조건 → 실제로 실행할 (where 필터 목록, 키). 같은 키면 결과도 같다. entities: 이미 추출한 결과"""
+        entities = entities or extract_entities(search["query"], self.company_index)
+        if search["split"] and len(entities["companies"]) > 1:
+            # 여러 기업 비교 질문은 기업별로 나눠 검색해야 한 기업이 k개를 독차지하지 않음
+            wheres = [self._build_where({**entities, "companies": [c]}, search["filter"]) for c in entities["companies"]]
+        else:
+            wheres = [self._build_where(entities, search["filter"])]
+        key = json.dumps([search["query"], search["k"], wheres], ensure_ascii=False, sort_keys=True)
+        return wheres, key
+
+    def _hybrid_search(self, query, vector, k, where):
+        """벡터 검색 + BM25 검색 결과를 RRF로 융합. 반환: [(doc, 코사인 거리 또는 None)]"""
+        with self.telemetry.span("vector_search"):
+            vector_hits = self.retriever.search(vector, k, where)
+        with self.telemetry.span("lexical_search"):
+            lexical_hits = self.lexical_index.search(query, k=k, where=where)
+
+        by_id = {doc.id: (doc, dist) for doc, dist in vector_hits}
+        fused = reciprocal_rank_fusion([list(by_id), [doc_id for doc_id, _ in lexical_hits]], k)
+
+        # BM25에서만 나온 문서는 본문을 벡터 DB에서 가져옴 (거리는 모름)
+        missing = [doc_id for doc_id in fused if doc_id not in by_id]
+        for doc in self.retriever.get_by_ids(missing) if missing else []:
+            by_id[doc.id] = (doc, None)
+        return [by_id[doc_id] for doc_id in fused if doc_id in by_id]
+
+    def _search(self, query, vector, k, where, memo):
+        memo_key = json.dumps([query, k, where], ensure_ascii=False, sort_keys=True)
+        if memo_key in memo:
+            return memo[memo_key]
+
+        results = self._hybrid_search(query, vector, k, where)
+        # 필터에 걸리는 문서가 없으면 (예: 미색인 연도) 전체 검색으로
+        if not results and where:
+            results = self._hybrid_search(query, vector, k, None)
+        memo[memo_key] = results
+        return results
+
     def node_retrieve(self, state: AgentState):
-        print("🔍 [Node: Retrieve] 관련 데이터를 찾는 중...")
+        log.debug("🔍 [Node: Retrieve] 관련 데이터를 찾는 중...")
         question = state["question"]
-        # k=5로 검색
-        docs = self.vector_db.as_retriever(search_kwargs={"k": 5}).invoke(question)
-        return {"context": docs, "retry_count": state.get("retry_count", 0) + 1}
-    
+        search = state.get("search") or self._initial_search(question)
+        query = search["query"]
+
+        # 질문에 등장한 기업/연도로 검색 범위를 좁힘 (1차 검색은 route에서 추출한 엔티티 재사용)
+        wheres, search_key = self._plan_search(search, None if state.get("tried") else state.get("entities"))
+        # query_stream에서 이미 계산한 임베딩이 있으면 재사용 (모델 재호출 없음, 약칭이 치환된 질문은 다시 임베딩)
+        if query == question and state.get("query_vector"):
+            vector = state["query_vector"]
+        else:
+            vector = self.embeddings.embed_query(query)
+
+        memo = dict(state.get("retrieval_memo") or {})
+        results, seen = [], set()
+        for where in wheres:
+            for doc, dist in self._search(query, vector, search["k"], where, memo):
+                if doc.page_content not in seen:
+                    seen.add(doc.page_content)
+                    results.append((doc, dist))
+        if len(wheres) > 1:
+            results.sort(key=lambda r: 2.0 if r[1] is None else r[1])
+
+        docs = [doc for doc, _ in results]
+        # 예전 l2 컬렉션의 거리는 스케일이 일정하지 않아 평가에 쓰지 않음
+        distances = [dist for _, dist in results] if self._cosine_distance else None
+        return {
+            "context": docs,
+            "distances": distances,
+            "search": search,
+            "search_key": search_key,
+            "tried": (state.get("tried") or []) + [search_key],
+            "retrieval_memo": memo,
+            "retry_count": state.get("retry_count", 0) + 1,
+        }
+
+    def _search_candidates(self, question):
+        """재검색 조건 후보 (앞에서부터 시도)"""
+        normalized = normalize_aliases(question, self.alias_index)
+        entities = extract_entities(normalized, self.company_index)
+        candidates = []
+        if len(entities["companies"]) > 1:
+            # 복수 기업 질문 → 기업별 분할 검색
+            candidates.append({"query": normalized, "k": 5, "filter": "strict", "split": True})
+        candidates += [
+            # 약칭 정규화 ('삼전' → '삼성전자'): 새로 잡힌 기업명으로 필터를 조임
+            {"query": normalized, "k": 5, "filter": "strict", "split": False},
+            # 연도 조건 완화 + k 확대
+            {"query": normalized, "k": 10, "filter": "company", "split": len(entities["companies"]) > 1},
+            # 필터 해제 + k 확대
+            {"query": normalized, "k": 15, "filter": "none", "split": False},
+        ]
+        return candidates
+
+    def node_transform_query(self, state: AgentState):
+        tried = set(state.get("tried") or [])
+        for search in self._search_candidates(state["question"]):
+            _, key = self._plan_search(search)
+            # 실제 검색이 달라지지 않는 조건(이미 시도한 키)은 건너뜀
+            if key not in tried:
+                log.debug(f"🔁 [Node: Transform] 재검색 조건: {search}")
+                return {"search": search}
+        log.debug("🛑 [Node: Transform] 더 바꿔볼 검색 조건이 없음")
+        return {"search": None}
+
+    def decide_after_transform(self, state: AgentState):
+        return "retrieve" if state.get("search") else "end"
+
     # === [ langgraph 통과 함수 ]
     # def node_grade_documents(self, state: AgentState):
     #     print("⚖️ [Node: Grade] (임시) API 호출 없이 통과 모드...")
@@ -82,14 +591,44 @@ class FinanceRAG:
     #     return {"relevance": "yes"}
 
     def node_grade_documents(self, state: AgentState):
-        print("⚖️ [Node: Grade] 데이터 품질 검사 시작...")
+        log.debug("⚖️ [Node: Grade] 데이터 품질 검사 시작...")
         question = state["question"]
         docs = state["context"]
 
         if not docs:
-            print("❌ [Grade] 검색된 문서가 아예 없음")
+            log.debug("❌ [Grade] 검색된 문서가 아예 없음")
+            self.telemetry.grades.inc(verdict="no", path="empty")
             return {"relevance": "no"}
 
+        # 같은 문서 묶음을 이미 평가했다면 (조건만 다르고 결과가 같은 재검색) 평가를 다시 하지 않음
+        query = (state.get("search") or {}).get("query", question)
+        grade_key = json.dumps([query] + [d.id or d.page_content for d in docs], ensure_ascii=False)
+        grade_memo = dict(state.get("grade_memo") or {})
+        if grade_key in grade_memo:
+            relevance, path = grade_memo[grade_key]
+            log.debug(f"♻️ [Grade] 이전과 같은 문서 묶음 → 평가 결과 재사용 ({relevance})")
+            self.telemetry.grades.inc(verdict=relevance, path="memo")
+            return {"relevance": relevance, "grade_path": path}
+
+        # 0. 로컬 규칙 평가: 기업/연도/지표 일치 + 벡터 거리로 확신할 수 있으면 LLM 호출 생략
+        entities = extract_entities(query, self.company_index)
+        verdict, score = self.grader.grade(entities, docs, state.get("distances"))
+        if verdict != "ambiguous":
+            self.grader.record(f"rule_{verdict}")
+            log.debug(f"📏 [Grade] 규칙 판정: {verdict.upper()} (score={score:.2f}, LLM 호출 생략)")
+            self.telemetry.grades.inc(verdict=verdict, path="rule")
+            grade_memo[grade_key] = (verdict, "rule")
+            return {"relevance": verdict, "grade_path": "rule", "grade_memo": grade_memo}
+
+        run = _current_run.get()
+        if run is not None and run["cancel"].is_set():
+            # 요청이 이미 취소됨 → 결과를 받을 사람이 없으므로 LLM 평가 생략
+            self.cancel_counters.inc(kind="llm_calls_avoided")
+            return {"relevance": "no", "grade_path": "cancelled"}
+
+        self.grader.record("llm")
+        log.debug(f"🤔 [Grade] 애매한 구간 (score={score:.2f}) → LLM 평가")
+
         # 1. LLM에게 판단 요청 (더 직관적인 프롬프트)
         prompt = ChatPromptTemplate.from_template("""
         너는 데이터 분석가야. 아래 [문서]에 [질문]에 대한 답을 할 수 있는 숫자가 하나라도 들어있니?
@@ -105,19 +644,24 @@ class FinanceRAG:
         결정:
         """)
     
+        # 레코드 JSON 전체 대신 질문과 관련된 지표만 압축한 표를 넘김
+        packed = self.context_packer.pack(query, docs, self.company_index)
         chain = prompt | self.llm | StrOutputParser()
         # LLM의 실제 답변을 raw_result에 담아 출력해봅니다.
-        raw_result = chain.invoke({"question": question, "docs": docs}).lower().strip()
+        with self.admission.llm.sync_slot(self.admission.timeouts["grade"]):
+            raw_result = chain.invoke({"question": question, "docs": packed}).lower().strip()
 
-        print(f"🤖 [Grade] LLM의 실제 판단: '{raw_result}'")
+        log.debug(f"🤖 [Grade] LLM의 실제 판단: '{raw_result}'")
 
         # 2. 결과 판정 (안전장치 추가: yes가 포함되어 있거나, 특정 키워드 매칭 시 통과)
-        if "yes" in raw_result:
-            print("✅ [Grade] 결과: YES")
-            return {"relevance": "yes"} # <--- 키 이름이 AgentState와 같아야 함
+        relevance = "yes" if "yes" in raw_result else "no"
+        self.telemetry.grades.inc(verdict=relevance, path="llm")
+        grade_memo[grade_key] = (relevance, "llm")
+        if relevance == "yes":
+            log.debug("✅ [Grade] 결과: YES")
         else:
-            print("❌ [Grade] 결과: NO")
-            return {"relevance": "no"}
+            log.debug("❌ [Grade] 결과: NO")
+        return {"relevance": relevance, "grade_path": "llm", "grade_memo": grade_memo} # <--- 키 이름이 AgentState와 같아야 함
 
     def decide_to_generate(self, state: AgentState):
         # state["relevance"]를 직접 접근해서 값이 있는지 확인
@@ -125,30 +669,31 @@ class FinanceRAG:
         retry_count = state.get("retry_count", 0)
         
         # 디버깅 로그 추가
-        print(f"🧐 [Decision Debug] 현재 상태의 relevance: '{relevance}'")
+        log.debug(f"🧐 [Decision Debug] 현재 상태의 relevance: '{relevance}'")
     
         if relevance == "yes":
-            print("✨ [Decision] 통과! 생성 노드로 이동")
+            log.debug("✨ [Decision] 통과! 생성 노드로 이동")
             return "generate"
         
         if retry_count > 2:
             return "end"
         
+        self.telemetry.rewrites.inc()
         return "rewrite"
 
-    def node_generate(self, state: AgentState):
-        print("✍️ [Node: Generate] 답변 생성 중...")
+    async def node_generate(self, state: AgentState):
+        # 답변 생성은 이 노드에서 단 한 번만 수행한다.
+        # query_stream이 그래프를 stream_mode="messages"로 돌리므로 여기서 나오는 토큰이 그대로 클라이언트로 전달됨
+        log.debug("✍️ [Node: Generate] 답변 생성 중...")
         docs = state["context"]
         question = state["question"]
         
         if not docs: return {"relevance": "no"}
-    
-        # 1차 필터링: 질문의 핵심 단어가 문서에 포함되어 있다면 LLM 호출 없이 통과!
-        keywords = [question[:4], "삼성", "전자"] # 예시 키워드
-        if any(k in docs[0].page_content for k in keywords):
-            print("⚡ [Grade] 키워드 매칭으로 API 호출 없이 통과!")
-            return {"relevance": "yes"}
-        context = "\n\n".join([d.page_content for d in state["context"]])
+
+        # 중복 제거 + 관련 지표·연도만 남긴 표 (CONTEXT_TOKEN_BUDGET 토큰 이내)
+        # 관련 범위는 grade와 같이 약칭이 정규화된 검색 질문으로 판단 ('삼전' → '삼성전자'), 프롬프트에는 원래 질문
+        query = (state.get("search") or {}).get("query", question)
+        context = self.context_packer.pack(query, docs, self.company_index)
         
         prompt = ChatPromptTemplate.from_template("""
         당신은 금융 분석 전문가입니다. 아래 제공된 재무 데이터를 바탕으로 질문에 답하세요.
@@ -161,25 +706,127 @@ class FinanceRAG:
         """)
         
         chain = prompt | self.llm | StrOutputParser()
-        answer = chain.invoke({"context": context, "question": question})
+        async with self.admission.llm.slot(self.admission.timeouts["generate"]):
+            # 호출을 시작한 뒤 취소되면 이미 과금된 호출이므로 '피한 LLM 호출'로 세지 않음
+            run = _current_run.get()
+            if run is not None:
+                run["generation_started"] = True
+            answer = await chain.ainvoke({"context": context, "question": question})
         return {"answer": answer}
 
     # --- [외부 호출 메서드] ---
 
-    async def query_stream(self, question: str):
-        inputs = {"question": question, "retry_count": 0}
-        
-        # 1. 그래프 실행
-        final_state = await asyncio.to_thread(self.app.invoke, inputs)
-        
-        # 2. 판단 결과 확인
-        if final_state.get("relevance") != "yes":
+    def query(self, question: str):
+        """동기 호출용: query_stream의 답변을 모아 하나의 문자열로 반환 (스크립트/노트북용)"""
+        async def collect():
+            return "".join([token async for token in self.query_stream(question)])
+        return asyncio.run(collect())
+
+    async def _replay(self, answer):
+        """캐시된 답변을 단어 단위 스트림으로 재생"""
+        for token in re.findall(r"\S+\s*|\s+", answer):
+            yield token
+            await asyncio.sleep(0)
+
+    def _flight_key(self, question):
+        """동시 요청 합치기용 질문 키: 별칭 정규화 + 공백/끝 문장부호 정리 + 소문자"""
+        return re.sub(r"[\s?!.]+", " ", normalize_aliases(question, self.alias_index)).strip().lower()
+
+    def is_in_flight(self, question):
+        return self.single_flight.in_flight(self._flight_key(question))
+
+    async def query_stream(self, question: str, request_id=None):
+        # 정규화한 질문이 같은 실행이 진행 중이면 그 실행에 붙어 (이미 나온 토큰부터) 같은 스트림을 받음
+        # 클라이언트가 끊기면 이 생성기가 취소되고, 마지막 구독자였다면 실행 자체도 취소됨
+        trace = self.telemetry.new_trace(question, request_id)
+        key = self._flight_key(question)
+        joined = self.single_flight.in_flight(key)
+        try:
+            async for token in self.single_flight.run(key, lambda: self._run_query(question, trace)):
+                self.telemetry.first_token(trace)
+                trace["tokens"] += 1
+                yield token
+            if joined:
+                trace["outcome"] = "coalesced"
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancel_counters.inc(kind="cancelled_requests")
+            raise
+        finally:
+            self.telemetry.finish(trace)
+
+    async def _run_query(self, question: str, trace=None):
+        if trace is not None:
+            self.telemetry.bind(trace)
+
+        # 0. 질문 임베딩은 한 번만 계산해 캐시 조회와 검색에 같이 사용
+        with self.telemetry.span("embed"):
+            vector = await self.embeddings.aembed_query(question)
+        entities = extract_entities(normalize_aliases(question, self.alias_index), self.company_index)
+
+        cached = self.answer_cache.lookup(vector, entities)
+        if cached is not None:
+            log.debug("💾 [Cache] 유사 질문의 답변 재사용 (Gemini 호출 없음)")
+            self.telemetry.annotate(outcome="cache")
+            async for token in self._replay(cached):
+                yield token
+            return
+
+        inputs = {"question": question, "retry_count": 0, "query_vector": vector}
+        final_state = {}
+        run = {"cancel": threading.Event(), "generation_started": False}
+        _current_run.set(run)
+
+        # 1. 그래프를 비동기로 실행하면서 generate 노드의 LLM 토큰을 도착 즉시 전달
+        #    (동시 실행 수를 넘으면 대기열에서 기다리고, 대기열이 차거나 오래 기다리면 거절)
+        try:
+            async with self.admission.pipeline.slot(self.admission.queue_timeout):
+                async for mode, payload in self.app.astream(inputs, stream_mode=["messages", "values"]):
+                    if mode == "messages":
+                        chunk, meta = payload
+                        if meta.get("langgraph_node") != "generate":
+                            continue
+                        usage = getattr(chunk, "usage_metadata", None)
+                        if usage:
+                            self.telemetry.llm_tokens.inc(usage.get("input_tokens", 0), kind="input")
+                            self.telemetry.llm_tokens.inc(usage.get("output_tokens", 0), kind="output")
+                        if chunk.content:
+                            yield chunk.content
+                    else:
+                        final_state = payload
+        except Overloaded as e:
+            log.warning(f"🚦 [Admission] {e}")
+            self.telemetry.annotate(outcome="overloaded")
+            yield "⏳ 요청이 많아 처리하지 못했습니다. 잠시 후 다시 시도해 주세요."
+            return
+        except StageTimeout as e:
+            log.warning(f"⏱️ [Admission] {e}")
+            self.telemetry.annotate(outcome="timeout", timeout_stage=e.stage)
+            yield "⏱️ 응답 시간이 초과되었습니다. 잠시 후 다시 시도해 주세요."
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            # 진행 중인 노드 태스크와 Gemini 스트림은 LangGraph가 취소, 스레드 풀의 동기 노드는 플래그로 LLM 호출 생략
+            run["cancel"].set()
+            self.cancel_counters.inc(kind="cancelled_runs")
+            if final_state.get("route") == "search" and not run["generation_started"]:
+                self.cancel_counters.inc(kind="llm_calls_avoided")
+            log.debug("🛑 [Cancel] 클라이언트 연결 끊김 → 그래프 실행 취소")
+            raise
+
+        self.telemetry.annotate(route=final_state.get("route"), retries=max(final_state.get("retry_count", 1) - 1, 0),
+                                grade_path=final_state.get("grade_path"))
+
+        # 2. 지표 저장소에서 바로 답한 경우 LLM 생성 없이 그대로 반환
+        if final_state.get("route") == "direct":
+            self.telemetry.annotate(outcome="direct")
+            yield final_state["answer"]
+            return
+
+        # 3. 판단 결과 확인 (generate까지 가지 못한 경우)
+        if final_state.get("relevance") != "yes" or not final_state.get("answer"):
+            self.telemetry.annotate(outcome="no_data")
             yield "❌ 질문과 관련된 정확한 데이터를 찾지 못했습니다. (데이터 부족)"
             return
 
-        # 3. 'yes'일 때만 Gemini 스트리밍 시작
-        context = "\n\n".join([d.page_content for d in final_state["context"]])
-        prompt = f"아래 데이터를 바탕으로 답하세요.\n\n{context}\n\n질문: {question}"
-        
-        async for chunk in self.llm.astream(prompt):
-            yield chunk.content
\ No newline at end of file
+        # 4. 생성까지 끝난 답변만 캐시에 저장
+        self.telemetry.annotate(outcome="answer")
+        self.answer_cache.store(vector, entities, final_state["answer"])
@@ -0,0 +1,133 @@
+"""
+grader.py — 검색 문서 적합성 규칙 기반 평가기 (애매한 경우에만 LLM으로)
+
+[역할]
+  node_grade_documents가 매 질문마다 Gemini에 문서 전체를 보내 yes/no를 받던 것을
+  로컬 점수 계산으로 대체한다. 확신할 수 있을 때는 여기서 바로 판정하고,
+  중간 구간(ambiguous)일 때만 기존 LLM 평가로 넘긴다.
+
+[점수 구성] (질문에 해당 요소가 있을 때만 반영, 0~1)
+  - company : 질문의 기업명 중 (질문 연도의) 검색 문서가 있는 비율
+  - year    : 질문의 연도 중 (질문 기업의) 검색 문서가 있는 비율
+              기업·연도는 문서별 (기업, 연도) 쌍으로 맞춤 (따로 모은 집합이면 서로 다른 문서끼리 맞아 버림)
+  - metric  : 질문의 지표(8대 지표 TARGET_MAPPING + 파생 비율) 중 검색 문서 레코드에 값(null 아님)이 있는 비율
+              (본문 문자열 검색은 모든 레코드가 같은 지표 키를 갖고 있어 항상 참이 됨)
+  - distance: 최상위 문서의 코사인 거리 (near 이하 1.0, far 이상 0.0, 사이는 선형)
+  질문에 기업/연도가 있는데 문서에 하나도 없으면 점수와 무관하게 'no' (거부권).
+  질문에서 아는 기업명을 찾지 못했으면 (예: 미색인 기업 'Apple') 'yes'로 확신하지 않고 LLM에 맡긴다.
+
+[주요 클래스]
+  - RuleBasedGrader.grade(entities, docs, distances) → ("yes" | "no" | "ambiguous", score)
+  - RuleBasedGrader.stats(): 판정 경로별 횟수 (rule_yes / rule_no / llm)
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG.node_grade_documents
+"""
+import json
+import threading
+
+from metric_store import parse_record_output
+
+WEIGHTS = {"company": 0.4, "year": 0.3, "metric": 0.15, "distance": 0.15}
+
+
+def _doc_output(doc):
+    """문서 본문(레코드 JSON)의 output. 파싱할 수 없으면 None"""
+    try:
+        return parse_record_output(json.loads(doc.page_content))
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def doc_metrics(doc):
+    """문서 레코드의 financial_metrics/analysis_ratios 중 값이 있는 지표 이름"""
+    output = _doc_output(doc)
+    if output is None:
+        return set()
+    values = {**(output.get("financial_metrics") or {}), **(output.get("analysis_ratios") or {})}
+    # 계산 불가 비율은 NaN으로 들어 있음 (value == value가 NaN을 거름)
+    return {metric for metric, value in values.items() if value is not None and value == value}
+
+
+def doc_entities(doc):
+    """문서의 (기업, 연도). 메타데이터가 없는 예전 색인은 본문(레코드 JSON)에서 파싱"""
+    meta = doc.metadata or {}
+    if meta.get("company"):
+        return meta["company"], str(meta.get("fiscal_year", ""))
+    output = _doc_output(doc)
+    if output is None:
+        return None, None
+    return output["metadata"]["company"], output["metadata"]["fiscal_year"]
+
+
+class RuleBasedGrader:
+    def __init__(self, yes_threshold=0.75, no_threshold=0.35, near_distance=0.2, far_distance=0.6):
+        self.yes_threshold = yes_threshold
+        self.no_threshold = no_threshold
+        self.near_distance = near_distance
+        self.far_distance = far_distance
+
+        self._lock = threading.Lock()
+        self.counts = {"rule_yes": 0, "rule_no": 0, "llm": 0}
+
+    def _distance_score(self, distance):
+        if distance <= self.near_distance:
+            return 1.0
+        if distance >= self.far_distance:
+            return 0.0
+        return (self.far_distance - distance) / (self.far_distance - self.near_distance)
+
+    def grade(self, entities, docs, distances=None):
+        """
+        distances: 문서별 코사인 거리 (없으면 거리 항목은 제외, BM25에서만 나온 문서는 None).
+        반환: (판정, 점수)
+        """
+        if not docs:
+            return "no", 0.0
+
+        doc_keys = {key for key in (doc_entities(d) for d in docs) if key[0]}
+
+        parts = {}
+        # 기업과 연도는 같은 문서에서 함께 맞아야 함 ('삼성전자 2024'에 (삼성전자, 2023) + (SK하이닉스, 2024)는 불일치)
+        years, companies = set(entities["years"]), set(entities["companies"])
+        if companies:
+            covered = {c for c, y in doc_keys if not years or y in years}
+            parts["company"] = sum(c in covered for c in entities["companies"]) / len(entities["companies"])
+            if parts["company"] == 0:
+                return "no", 0.0
+        if years:
+            covered = {y for c, y in doc_keys if not companies or c in companies}
+            parts["year"] = sum(y in covered for y in entities["years"]) / len(entities["years"])
+            if parts["year"] == 0:
+                return "no", 0.0
+        if entities["metrics"]:
+            doc_values = set().union(*(doc_metrics(d) for d in docs))
+            parts["metric"] = sum(m in doc_values for m in entities["metrics"]) / len(entities["metrics"])
+        known = [d for d in distances or () if d is not None]
+        if known:
+            parts["distance"] = self._distance_score(min(known))
+
+        if not parts:
+            return "ambiguous", 0.5
+
+        total_weight = sum(WEIGHTS[k] for k in parts)
+        score = sum(WEIGHTS[k] * v for k, v in parts.items()) / total_weight
+
+        if score >= self.yes_threshold:
+            return ("yes" if "company" in parts else "ambiguous"), score
+        if score <= self.no_threshold:
+            return "no", score
+        return "ambiguous", score
+
+    def record(self, path):
+        with self._lock:
+            self.counts[path] += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "llm_calls_saved": total - self.counts["llm"],
+                "rule_ratio": round((total - self.counts["llm"]) / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,207 @@
+"""
+lexical_index.py — 한국어 문자 n-gram BM25 역색인 (프로세스 내, 벡터 검색과 하이브리드)
+
+[역할]
+  밀집 벡터 검색이 약한 정확한 토큰('HD현대중공업' vs 'HD현대', '2024')을 잡기 위해
+  색인 문서의 글자 2·3-gram으로 BM25 역색인을 만들고, node_retrieve에서 벡터 검색 결과와
+  RRF(Reciprocal Rank Fusion)로 합친다.
+
+[설계]
+  - 토큰: 한글/영문 연속 구간은 글자 2·3-gram, 연도는 4자리 숫자 그대로 (금액 숫자는 색인 제외)
+  - BM25의 문서 쪽 항(tf, 문서 길이 정규화, idf)은 색인 시 미리 곱해 posting 가중치로 저장
+    → 질의 시에는 질의어 posting 가중치를 numpy로 더하기만 하면 됨 (수천 건 기준 수십 µs)
+  - 거의 모든 문서에 등장하는 n-gram(idf≈0, 예: '재무', '영업')은 질의에서 건너뜀
+  - company / fiscal_year 메타데이터를 배열로 들고 있어 Chroma와 같은 where 필터를 마스크로 적용
+
+[주요 클래스/함수]
+  - NgramBM25Index: add(ids, docs) / search(query, k, where) / save(path) / load(path)
+  - reciprocal_rank_fusion(rankings, k, c=60): 여러 순위 목록 → 융합 순위
+  - MetadataColumns: company / fiscal_year 정수 코드 컬럼 + where 필터 → bool 마스크 (vector_snapshot.py와 공유)
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG (db_dir/lexical_index.pkl 로 저장·로드, node_retrieve에서 융합)
+"""
+import os
+import re
+import json
+import math
+import pickle
+from collections import Counter
+
+import numpy as np
+
+from metric_store import parse_record_output
+
+TOKEN_PATTERN = re.compile(r'[가-힣]+|[A-Za-z]+|(?<![\d,])\d{4}(?![\d,])')
+MIN_IDF = 0.05
+
+
+def tokenize(text, ngram_range=(2, 3)):
+    terms = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token.isdigit():
+            terms.append(token)
+            continue
+        token = token.lower()
+        if len(token) < ngram_range[0]:
+            terms.append(token)
+            continue
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            terms.extend(token[i:i + n] for i in range(len(token) - n + 1))
+    return terms
+
+
+def index_text(doc):
+    """색인할 텍스트: 레코드 JSON이면 요약 문장(input)만, 아니면 본문 그대로"""
+    try:
+        record = json.loads(doc.page_content)
+        if isinstance(record, dict) and record.get("input"):
+            return record["input"]
+    except (ValueError, TypeError):
+        pass
+    return doc.page_content
+
+
+class MetadataColumns:
+    """company / fiscal_year 메타데이터를 정수 코드 배열(없으면 -1)로 들고 where 필터를 마스크로 평가"""
+
+    def __init__(self, companies, years):
+        self.company_codes = {c: i for i, c in enumerate(dict.fromkeys(c for c in companies if c))}
+        self.companies = np.asarray([self.company_codes.get(c, -1) for c in companies], dtype=np.int32)
+        self.years = np.asarray([int(y) if y and str(y).isdigit() else -1 for y in years], dtype=np.int32)
+
+    @classmethod
+    def from_metadatas(cls, metadatas):
+        metadatas = [m or {} for m in metadatas]
+        return cls([m.get("company") for m in metadatas], [m.get("fiscal_year") for m in metadatas])
+
+    def mask(self, where):
+        """Chroma where 필터({"$and": [...]}, {"field": {"$in"/"$eq": ...}}) → bool 마스크 (필터 없으면 None)"""
+        if not where:
+            return None
+        if "$and" in where:
+            mask = np.ones(len(self.companies), dtype=bool)
+            for cond in where["$and"]:
+                mask &= self.mask(cond)
+            return mask
+        (field, cond), = where.items()
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        values = cond.get("$in", [cond.get("$eq")])
+        if field == "company":
+            return np.isin(self.companies, [self.company_codes.get(v, -2) for v in values])
+        return np.isin(self.years, [int(v) for v in values])
+
+
+def reciprocal_rank_fusion(rankings, k, c=60):
+    """rankings: [[id, ...], ...] (각각 좋은 순) → 융합 점수 상위 k개 id"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (c + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+class NgramBM25Index:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.doc_ids = []
+        self._id_pos = {}
+        self.doc_lens = []
+        self.postings = {}         # term → {doc_idx: tf}
+        self.doc_company = []
+        self.doc_year = []
+
+        self._compiled = None      # term → (doc_idx 배열, 가중치 배열) — 문서가 추가되면 다시 계산
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    # --- [색인] ---
+
+    def add(self, ids, docs):
+        for doc_id, doc in zip(ids, docs):
+            if doc_id in self._id_pos:
+                continue
+            idx = len(self.doc_ids)
+            self._id_pos[doc_id] = idx
+            self.doc_ids.append(doc_id)
+
+            terms = tokenize(index_text(doc))
+            self.doc_lens.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[idx] = tf
+
+            meta = doc.metadata or {}
+            if not meta.get("company"):
+                try:
+                    output = parse_record_output(json.loads(doc.page_content))
+                    meta = output["metadata"] if output else meta
+                except ValueError:
+                    pass
+            self.doc_company.append(meta.get("company"))
+            self.doc_year.append(str(meta.get("fiscal_year", "")) or None)
+        self._compiled = None
+
+    def _compile(self):
+        n = len(self.doc_ids)
+        lens = np.asarray(self.doc_lens, dtype=np.float32)
+        avgdl = float(lens.mean()) if n else 0.0
+        norm = self.k1 * (1 - self.b + self.b * lens / avgdl) if n else lens
+
+        compiled = {}
+        for term, posting in self.postings.items():
+            df = len(posting)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if idf < MIN_IDF:
+                continue
+            idx = np.fromiter(posting.keys(), dtype=np.int32, count=df)
+            tf = np.fromiter(posting.values(), dtype=np.float32, count=df)
+            compiled[term] = (idx, (idf * tf * (self.k1 + 1) / (tf + norm[idx])).astype(np.float32))
+
+        self._columns = MetadataColumns(self.doc_company, self.doc_year)
+        self._compiled = compiled
+
+    # --- [검색] ---
+
+    def search(self, query, k=5, where=None):
+        """BM25 상위 k개 [(id, score)] (점수 0인 문서 제외)"""
+        if not self.doc_ids:
+            return []
+        if self._compiled is None:
+            self._compile()
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._compiled.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+
+        mask = self._columns.mask(where)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    # --- [저장/로드] ---
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, "rb") as f:
+            index.__dict__.update(pickle.load(f))
+        index._id_pos = {doc_id: i for i, doc_id in enumerate(index.doc_ids)}
+        return index
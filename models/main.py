@@ -1,10 +1,61 @@
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+import os
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from finance_rag import FinanceRAG
 
-app = FastAPI()
-rag = FinanceRAG() # 서버 시작 시 DB 로드
+from admission import Overloaded
+
+# 기동 시 미리 임베딩해 볼 질문 (WARMUP_QUERIES="질문1|질문2"로 변경, WARMUP_ENABLED=0이면 생략)
+DEFAULT_WARMUP_QUERIES = "삼성전자 2024년 영업이익|SK하이닉스 재무 상태 평가해줘"
+
+rag = None
+startup = {"ready": False, "error": None, "timings": {}}
+
+
+def _load_rag():
+    # 무거운 임포트(LangChain, sentence-transformers, Chroma)와 모델 생성은 여기서만 수행
+    start = time.perf_counter()
+    from finance_rag import FinanceRAG
+    startup["timings"]["import_finance_rag"] = round(time.perf_counter() - start, 4)
+
+    start = time.perf_counter()
+    instance = FinanceRAG()
+    startup["timings"].update({f"init_{k}": v for k, v in instance.init_timings.items()})
+    startup["timings"]["init_total"] = round(time.perf_counter() - start, 4)
+
+    if os.getenv("WARMUP_ENABLED", "1") != "0":
+        queries = [q for q in os.getenv("WARMUP_QUERIES", DEFAULT_WARMUP_QUERIES).split("|") if q.strip()]
+        startup["timings"].update(instance.warmup(queries))
+    return instance
+
+
+async def _startup():
+    global rag
+    try:
+        # 이미 주입된 인스턴스가 있으면 그대로 사용 (bench_load.py 등)
+        if rag is None:
+            rag = await asyncio.to_thread(_load_rag)
+        startup["ready"] = True
+        print("🚀 [Startup] 준비 완료: " + ", ".join(f"{k}={v}s" for k, v in startup["timings"].items()))
+    except Exception as e:
+        startup["error"] = repr(e)
+        print(f"❌ [Startup] 초기화 실패: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 모델 로드를 백그라운드로 돌려 포트는 바로 열고(/healthz), 준비 전까지 /readyz는 503
+    task = asyncio.create_task(_startup())
+    yield
+    task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS 설정 추가
 from fastapi.middleware.cors import CORSMiddleware # 추가
@@ -19,14 +70,110 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     question: str
 
+async def _wait_disconnect(request: Request, poll=0.5):
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll)
+
+async def _stream_until_disconnect(request: Request, tokens):
+    """
+    토큰을 그대로 흘려보내다가 클라이언트 연결이 끊기면 토큰 생성기를 취소한다.
+    (검색/평가 중에는 보낼 토큰이 없어 서버가 끊김을 알아채지 못하므로 따로 감시)
+    취소는 query_stream → 그래프 실행 → Gemini 스트림까지 전파된다.
+    """
+    watcher = asyncio.create_task(_wait_disconnect(request))
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(tokens.__anext__())
+            done, _ = await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if step not in done:
+                step.cancel()
+                await asyncio.gather(step, return_exceptions=True)
+                return
+            try:
+                yield step.result()
+            except StopAsyncIteration:
+                return
+    finally:
+        watcher.cancel()
+        # Starlette(ASGI 2.3+)는 연결이 끊기면 step이 실행 중인 채로 이 생성기를 취소한다.
+        # step을 먼저 취소해야 CancelledError가 tokens 안으로 전파되고(→ 실행 취소 플래그, 슬롯 반납),
+        # 실행 중인 생성기에 aclose()를 부르면 RuntimeError가 난다.
+        if step is not None and not step.done():
+            step.cancel()
+            try:
+                await asyncio.wait({step})
+            except asyncio.CancelledError:
+                pass   # 바깥 취소가 다시 들어와도 step 취소는 이미 전달됨
+        if step is None or step.done():
+            await tokens.aclose()
+
+def get_rag():
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="모델 준비 중입니다.", headers={"Retry-After": "5"})
+    return rag
+
+@app.get("/healthz")
+async def healthz():
+    # 프로세스 생존 여부 (모델 준비와 무관)
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    # 모델 로드 + 워밍업까지 끝나야 200
+    body = {"ready": startup["ready"], "error": startup["error"], "timings": startup["timings"]}
+    return JSONResponse(body, status_code=200 if startup["ready"] else 503)
+
 @app.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
-    # StreamingResponse를 사용하여 한 토큰씩 응답
+async def chat_stream(request: ChatRequest, http_request: Request):
+    rag = get_rag()
+    # 요청 ID: 클라이언트가 준 X-Request-ID를 그대로 쓰고, 없으면 새로 발급 (JSON 로그와 응답 헤더에 기록)
+    request_id = http_request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    # 스트리밍을 시작하면 상태 코드를 바꿀 수 없으므로, 대기열이 꽉 찼으면 여기서 바로 429로 거절
+    # (같은 질문이 이미 실행 중이면 새 실행 없이 합류하므로 검사하지 않음)
+    try:
+        if not rag.is_in_flight(request.question):
+            rag.admission.check()
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    # StreamingResponse를 사용하여 한 토큰씩 응답 (연결이 끊기면 실행 취소)
     return StreamingResponse(
-        rag.query_stream(request.question), 
-        media_type="text/event-stream"
+        _stream_until_disconnect(http_request, rag.query_stream(request.question, request_id)),
+        media_type="text/event-stream",
+        headers={"X-Request-ID": request_id},
     )
 
+@app.get("/cache/stats")
+async def cache_stats():
+    # 시맨틱 답변 캐시 히트/미스 카운터
+    return get_rag().answer_cache.stats()
+
+@app.get("/grade/stats")
+async def grade_stats():
+    # 적합성 평가 경로별 횟수 (규칙 판정으로 아낀 LLM 호출 수 포함)
+    return get_rag().grader.stats()
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus 텍스트 형식: 단계별 지연 히스토그램, 요청/재검색/판정/LLM 토큰 카운터, 구성 요소 stats 게이지
+    return PlainTextResponse(get_rag().telemetry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cancel/stats")
+async def cancel_stats():
+    # 연결 끊김으로 취소된 요청/실행 수, 취소로 하지 않은 LLM 호출 수
+    return get_rag().cancel_stats()
+
+@app.get("/coalesce/stats")
+async def coalesce_stats():
+    # 실행 중인 질문 수, 새로 시작한 실행 수, 실행 중인 질문에 합류한 요청 수
+    return get_rag().single_flight.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    # 파이프라인/LLM 동시 실행 수, 대기열 길이, 거절·타임아웃 횟수
+    return get_rag().admission.stats()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,335 @@
+"""
+metric_store.py — 재무 지표 인메모리 컬럼형 저장소 + 직접 조회 라우터
+
+[역할]
+  top_30_financial_data.jsonl / dart_financial_analysis_dataset.jsonl 레코드의
+  output JSON(financial_metrics, analysis_ratios)을 (기업, 회계연도, 지표) 단위로
+  메모리에 올려두고, "삼성전자 2024년 영업이익" 같은 단순 조회 질문을
+  벡터 검색·LLM 호출 없이 바로 답변한다.
+
+[주요 클래스/함수]
+  - MetricStore: 컬럼(array) 기반 저장소. (company, fiscal_year, metric) → 행 인덱스.
+      - from_jsonl(paths): JSONL 파일들로부터 저장소 구축
+      - lookup(company, year, metric): 단일 값 조회
+      - resolve(question, entities): 질문 파싱 → 정확히 하나의 기업/연도가 잡히면 답변 문자열 반환
+  - extract_entities(question, company_index): 질문에서 기업명·연도·지표를 추출 (최장 일치)
+  - build_term_index(terms): extract_entities용 용어 사전 (기업명 목록 → 첫 글자 인덱스)
+  - parse_record_output(record): 데이터셋 레코드의 output JSON 파싱
+  - normalize_aliases(question, alias_index): 기업 약칭/통칭('삼전', '현대차' 등)을 색인된 정식 기업명으로 치환
+  - build_alias_index(company_names): 약칭 + 실제 기업명 전체 사전 (실제 기업명이 더 길게 걸리면 치환 안 함)
+  - load_company_names(path): corp_list.csv의 상장사 이름 목록 (없으면 빈 목록)
+  - format_krw(value): 원 단위 금액을 '조/억' 단위 문자열로 변환
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG.node_route (retrieve 앞단 라우터, 약칭 정규화 + 엔티티 추출 1회),
+    FinanceRAG.node_retrieve (질문의 기업/연도 → 메타데이터 필터),
+    FinanceRAG.node_transform_query (재검색 시 별칭 정규화)
+"""
+import os
+import re
+import csv
+import json
+import math
+from array import array
+
+# 8대 지표 + 파생 비율의 질문 내 표현(별칭). 긴 표현부터 매칭되므로
+# '영업이익률'이 '영업이익'에, '부채비율'이 '부채'에 먹히지 않는다.
+METRIC_ALIASES = {
+    '매출액': ['매출액', '매출'],
+    '영업이익': ['영업이익'],
+    '당기순이익': ['당기순이익', '순이익'],
+    '자산총계': ['자산총계', '총자산', '자산'],
+    '부채총계': ['부채총계', '총부채', '부채'],
+    '자본총계': ['자본총계', '총자본'],
+    '영업활동현금흐름': ['영업활동현금흐름', '영업활동으로 인한 현금흐름', '영업현금흐름'],
+    '자본금': ['자본금'],
+    '부채비율': ['부채비율'],
+    '자기자본비율': ['자기자본비율'],
+    '영업이익률': ['영업이익률'],
+    'ROE': ['ROE', 'roe', '자기자본이익률'],
+}
+
+# 질문에서 자주 쓰이는 기업 약칭/통칭 → 데이터셋(DART) 정식 기업명
+COMPANY_ALIASES = {
+    '삼전': '삼성전자',
+    '하이닉스': 'SK하이닉스',
+    '현대차': '현대자동차',
+    '기아차': '기아',
+    '엘지엔솔': 'LG에너지솔루션',
+    'LG엔솔': 'LG에너지솔루션',
+    '네이버': 'NAVER',
+    '포스코홀딩스': 'POSCO홀딩스',
+    '포스코': 'POSCO홀딩스',
+    '한전': '한국전력공사',
+    '한국전력': '한국전력공사',
+    '삼바': '삼성바이오로직스',
+    '한화에어로': '한화에어로스페이스',
+    '현대중공업': 'HD현대중공업',
+    '두산에너지빌리티': '두산에너빌리티',
+}
+
+# analysis_ratios 쪽 지표 (단위: %)
+RATIO_METRICS = ('부채비율', '자기자본비율', '영업이익률', 'ROE')
+
+# 단순 조회가 아닌 '해석'을 원하는 질문은 LLM 파이프라인으로 넘긴다.
+ANALYSIS_KEYWORDS = ('분석', '평가', '비교', '추세', '전망', '왜', '이유', '어때', '설명', '의견')
+
+YEAR_PATTERN = re.compile(r'(?<!\d)(20\d{2}|\d{2})\s*(?:년|회계연도|FY)|(?<!\d)(20\d{2})(?!\d)')
+
+
+def format_krw(value):
+    """원 단위 금액을 '32조 7,259억원' 형태로 변환 (1억 미만은 원 단위 그대로)"""
+    value = int(value)
+    sign = '-' if value < 0 else ''
+    value = abs(value)
+    jo, rest = divmod(value, 10**12)
+    eok = rest // 10**8
+    if jo == 0 and eok == 0:
+        return f"{sign}{value:,}원"
+    parts = []
+    if jo:
+        parts.append(f"{jo:,}조")
+    if eok:
+        parts.append(f"{eok:,}억")
+    return sign + " ".join(parts) + "원"
+
+
+def normalize_aliases(question, alias_index=None):
+    """
+    기업 약칭을 정식 기업명으로 치환 (최장 일치: 'HD현대중공업' 안의 '현대중공업'은 그대로 둠)
+    alias_index: build_alias_index(실제 기업명 목록). 약칭만 아는 기본 사전은 '현대차증권' → '현대자동차증권'처럼
+    실제 기업명의 일부를 바꿔 버리므로, 색인된 기업명을 함께 넣은 사전을 넘겨야 한다.
+    """
+    alias_index = alias_index or _COMPANY_NAME_INDEX
+    out, i = [], 0
+    while i < len(question):
+        term = next((t for t in alias_index.get(question[i], ()) if question.startswith(t, i)), None)
+        if term:
+            out.append(COMPANY_ALIASES.get(term, term))
+            i += len(term)
+        else:
+            out.append(question[i])
+            i += 1
+    return "".join(out)
+
+
+def parse_record_output(record):
+    """레코드의 output(JSON 문자열)을 dict로 파싱. metadata(company, fiscal_year)가 없으면 None"""
+    output = record.get("output")
+    if isinstance(output, str):
+        try:
+            output = json.loads(output)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(output, dict):
+        return None
+
+    meta = output.get("metadata", {})
+    company = str(meta.get("company", "")).strip()
+    year = str(meta.get("fiscal_year", "")).strip()
+    if not company or not year.isdigit():
+        return None
+    output["metadata"] = {"company": company, "fiscal_year": year}
+    return output
+
+
+def build_term_index(terms):
+    """첫 글자 → 후보 용어(긴 것 우선) 인덱스. 질문 길이에 비례하는 스캔을 위해 사용"""
+    index = {}
+    for term in terms:
+        if term:
+            index.setdefault(term[0], []).append(term)
+    for candidates in index.values():
+        candidates.sort(key=len, reverse=True)
+    return index
+
+
+def _scan_terms(text, term_index, taken):
+    """text에서 term_index의 용어를 최장 일치로 찾는다. taken(글자 위치 마스크)은 갱신된다."""
+    found = []
+    i = 0
+    while i < len(text):
+        matched = None
+        if not taken[i]:
+            for term in term_index.get(text[i], ()):
+                end = i + len(term)
+                if text.startswith(term, i) and not any(taken[i:end]):
+                    matched = term
+                    break
+        if matched:
+            for j in range(i, i + len(matched)):
+                taken[j] = True
+            found.append(matched)
+            i += len(matched)
+        else:
+            i += 1
+    return found
+
+
+def build_alias_index(company_names=()):
+    """약칭 + 정식명 + 실제 기업명을 한 사전에 넣어 최장 일치로 스캔 (기업명이 걸리면 치환하지 않음)"""
+    return build_term_index(set(COMPANY_ALIASES) | set(COMPANY_ALIASES.values()) | set(company_names))
+
+
+def load_company_names(path):
+    """corp_list.csv(backend/src/tools/dart_collector.py 결과)의 corp_name 목록. 파일이 없으면 빈 목록"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [row['corp_name'].strip() for row in csv.DictReader(f) if row.get('corp_name')]
+
+
+_METRIC_INDEX = build_term_index([a for aliases in METRIC_ALIASES.values() for a in aliases])
+# 약칭만 아는 기본 사전 (실제 기업명 목록 없이 쓸 때)
+_COMPANY_NAME_INDEX = build_alias_index()
+_ALIAS_TO_METRIC = {a: metric for metric, aliases in METRIC_ALIASES.items() for a in aliases}
+
+
+def extract_entities(question, company_index):
+    """
+    질문에서 기업명·연도·지표를 추출한다.
+    company_index는 build_term_index(기업명 목록)의 결과 (MetricStore.company_index 등).
+    반환: {"companies": [...], "years": [...], "metrics": [...]} (등장 순서, 중복 제거)
+    """
+    taken = [False] * len(question)
+
+    # 1. 기업명 먼저 (예: 'HD현대중공업' 안의 글자가 지표/연도로 오인되지 않도록)
+    companies = _scan_terms(question, company_index, taken)
+
+    # 2. 연도 ('2024년', '24년', '2024')
+    years = []
+    for m in YEAR_PATTERN.finditer(question):
+        if any(taken[m.start():m.end()]):
+            continue
+        raw = m.group(1) or m.group(2)
+        year = raw if len(raw) == 4 else f"20{raw}"
+        years.append(year)
+        for j in range(m.start(), m.end()):
+            taken[j] = True
+
+    # 3. 지표 (별칭 → 표준 지표명)
+    metrics = [_ALIAS_TO_METRIC[a] for a in _scan_terms(question, _METRIC_INDEX, taken)]
+
+    dedup = lambda xs: list(dict.fromkeys(xs))
+    return {"companies": dedup(companies), "years": dedup(years), "metrics": dedup(metrics)}
+
+
+class MetricStore:
+    """
+    (기업, 회계연도, 지표) → 값 을 담는 컬럼형 저장소.
+    기업/지표명은 사전 인코딩(id)하고 각 컬럼은 array로 보관해 레코드 수천~수만 건에도
+    메모리를 적게 쓰며, 조회는 튜플 키 해시 인덱스로 O(1)이다.
+    """
+
+    def __init__(self):
+        # 사전(dictionary) 인코딩
+        self.companies = []
+        self.metrics = []
+        self._company_ids = {}
+        self._metric_ids = {}
+
+        # 컬럼
+        self._col_company = array('I')
+        self._col_year = array('H')
+        self._col_metric = array('H')
+        self._col_value = array('d')  # 최대 수백조원 → 2^53 미만이므로 정수 손실 없음
+
+        # (company, year, metric) → row
+        self._index = {}
+        self._company_index = None
+
+    def __len__(self):
+        return len(self._col_value)
+
+    @classmethod
+    def from_jsonl(cls, paths):
+        """JSONL 파일들로 저장소 구축 (없는 파일은 건너뜀)"""
+        store = cls()
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        store.add_record(json.loads(line))
+        return store
+
+    def _encode(self, value, table, ids):
+        if value not in ids:
+            ids[value] = len(table)
+            table.append(value)
+        return ids[value]
+
+    def add_record(self, record):
+        """데이터셋 레코드({"instruction", "input", "output"}) 한 건을 저장소에 반영"""
+        output = parse_record_output(record)
+        if output is None:
+            return
+
+        company = output["metadata"]["company"]
+        year = output["metadata"]["fiscal_year"]
+
+        values = dict(output.get("financial_metrics", {}))
+        values.update(output.get("analysis_ratios", {}))
+        for metric, value in values.items():
+            # 데이터셋의 계산 불가 비율은 NaN (예: 금융지주의 영업이익률) → 값이 없는 것으로
+            if value is None or value != value:
+                continue
+            self.put(company, year, metric, value)
+
+    def put(self, company, year, metric, value):
+        """NaN/inf는 저장하지 않음 (직접 답변으로 'nan%'가 나가지 않도록, 검색 경로에 맡김)"""
+        value = float(value)
+        if not math.isfinite(value):
+            return
+        key = (company, str(year), metric)
+        row = self._index.get(key)
+        if row is not None:
+            # 같은 키가 다시 들어오면 최신 값으로 덮어씀
+            self._col_value[row] = value
+            return
+        self._col_company.append(self._encode(company, self.companies, self._company_ids))
+        self._col_year.append(int(year))
+        self._col_metric.append(self._encode(metric, self.metrics, self._metric_ids))
+        self._col_value.append(value)
+        self._index[key] = len(self._col_value) - 1
+        self._company_index = None
+
+    def lookup(self, company, year, metric):
+        row = self._index.get((company, str(year), metric))
+        return None if row is None else self._col_value[row]
+
+    @property
+    def company_index(self):
+        if self._company_index is None:
+            self._company_index = build_term_index(self.companies)
+        return self._company_index
+
+    def format_value(self, metric, value):
+        if metric in RATIO_METRICS:
+            return f"{value:g}%"
+        return f"{format_krw(value)} ({int(value):,}원)"
+
+    def resolve(self, question, entities=None):
+        """
+        질문이 '기업 1개 + 연도 1개 + 지표 1개 이상'의 단순 조회일 때만 답변 문자열을 반환한다.
+        그 외(기업/연도 누락·복수, 분석 요청, 저장소에 없는 값)는 None → 기존 파이프라인으로.
+        entities: 호출한 쪽에서 이미 추출한 결과 (약칭 정규화 후, FinanceRAG.node_route)
+        """
+        if not len(self) or any(k in question for k in ANALYSIS_KEYWORDS):
+            return None
+
+        entities = entities or extract_entities(question, self.company_index)
+        if len(entities["companies"]) != 1 or len(entities["years"]) != 1 or not entities["metrics"]:
+            return None
+
+        company, year = entities["companies"][0], entities["years"][0]
+        lines = []
+        for metric in entities["metrics"]:
+            value = self.lookup(company, year, metric)
+            if value is None:
+                return None
+            lines.append(f"- {metric}: {self.format_value(metric, value)}")
+
+        return f"{company}의 {year}년 재무 데이터입니다.\n" + "\n".join(lines)
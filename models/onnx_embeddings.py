@@ -0,0 +1,120 @@
+"""
+onnx_embeddings.py — ko-sroberta-multitask ONNX(int8 동적 양자화) CPU 임베딩 백엔드
+
+[역할]
+  HuggingFaceEmbeddings(fp32 PyTorch)를 대신해 같은 모델을 ONNX로 내보내고 int8 동적 양자화한 뒤
+  onnxruntime(intra-op 스레드 지정)으로 실행한다. 질문 임베딩 지연과 대량 적재 처리량을 개선하기 위함.
+
+[동작]
+  - 최초 1회: transformers 모델을 torch.onnx.export → onnxruntime.quantization.quantize_dynamic(QInt8)
+    결과는 cache_dir에 저장되어 이후에는 바로 로드 (torch 불필요)
+  - 추론: 토크나이저(numpy 텐서) → ONNX 세션 → attention mask 기반 mean pooling
+    (sentence-transformers 설정과 동일: max_seq_length 128, 정규화 없음)
+
+[주요 클래스/함수]
+  - OnnxEmbeddings: LangChain Embeddings 인터페이스 (embed_query / embed_documents)
+  - make_embeddings(backend): "hf" | "onnx" → 기본 임베딩 객체 생성
+
+[의존]
+  - onnxruntime, transformers (+ 최초 변환 시 torch)
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG(embedding_backend=...)
+  - bench_embeddings.py → 두 백엔드 정합성·성능 비교
+"""
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "jhgan/ko-sroberta-multitask"
+
+
+def make_embeddings(backend="hf", model_name=MODEL_NAME, **kwargs):
+    """임베딩 백엔드 선택: "hf" (PyTorch fp32, 기존) / "onnx" (ONNX int8)"""
+    if backend == "hf":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={'device': 'cpu'})
+    if backend == "onnx":
+        return OnnxEmbeddings(model_name=model_name, **kwargs)
+    raise ValueError(f"알 수 없는 임베딩 백엔드: {backend} (hf | onnx)")
+
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model_name=MODEL_NAME, cache_dir="./onnx_models", quantize=True,
+                 intra_op_threads=None, max_length=128, batch_size=64):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        int8_path = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(fp32_path):
+            self._export(model_dir, fp32_path)
+        if quantize and not os.path.exists(int8_path):
+            self._quantize(fp32_path, int8_path)
+        self.model_path = int8_path if quantize else fp32_path
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or os.cpu_count()
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _export(self, model_dir, fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        print(f"📦 [ONNX] {self.model_name} 변환 중 → {fp32_path}")
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        tokenizer.save_pretrained(model_dir)
+        model = AutoModel.from_pretrained(self.model_name).eval()
+
+        sample = tokenizer(["삼성전자 2024년 영업이익"], return_tensors="pt")
+        dynamic = {0: "batch", 1: "seq"}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "last_hidden_state": dynamic},
+                opset_version=17,
+            )
+
+    def _quantize(self, fp32_path, int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"🗜️ [ONNX] int8 동적 양자화 → {int8_path}")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    def _embed(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[i:i + self.batch_size], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            # mean pooling (패딩 토큰 제외)
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts))
+
+    def embed_query(self, text):
+        return self._embed([text])[0]
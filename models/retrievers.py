@@ -0,0 +1,191 @@
+"""
+retrievers.py — 벡터 검색 백엔드 (Chroma / 프로세스 내 NumPy flat index)
+
+[역할]
+  FinanceRAG의 벡터 검색을 백엔드 객체 하나로 감싼다. 수천~수백만 건 규모에서는
+  정규화된 행렬 한 번의 내적 + argpartition이 Chroma 클라이언트를 거치는 것보다 빠르고,
+  여러 질문을 행렬 곱 한 번으로 함께 채점할 수 있다.
+
+[공통 인터페이스]
+  - search(vector, k, where)          → [(Document, 거리)]
+  - search_batch(vectors, k, where)   → 질문별 [(Document, 거리)] 목록 (where는 하나 또는 질문별 목록)
+  - get_by_ids(ids)                   → [Document]
+  - metadatas()                       → 전체 문서 메타데이터 (기업명 사전 구축용)
+  - refresh(ids)                      → update_data로 컬렉션에 새로 들어간 문서 반영
+  - update_metadatas(ids, metadatas)  → 메타데이터만 바뀐 문서 반영 (예전 문서 메타데이터 보강)
+  - cosine_distance                   → 거리가 코사인 거리인지 (규칙 평가기에서 거리 점수 사용 여부)
+
+[구현]
+  - ChromaRetriever: 기존 Chroma 컬렉션 그대로
+  - NumpyFlatIndex : (N, dim) 정규화 행렬(float32/float16) + where 필터 마스크(MetadataColumns)
+      · from_chroma(vector_db): 컬렉션의 저장된 임베딩을 메모리로 (재임베딩 없음)
+      · vector_snapshot.VectorSnapshot: mmap 행렬 위에서 동작
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG(retriever_backend="chroma" | "numpy")
+  - vector_snapshot.py → 스냅샷 검색
+  - bench_retrieval.py → Chroma vs NumPy 지연/재현율 비교
+"""
+import numpy as np
+from langchain_core.documents import Document
+
+from lexical_index import MetadataColumns
+
+# float16 행렬은 이 행 수 단위로 float32로 올려 곱함 (임시 메모리 상한)
+SEARCH_CHUNK_ROWS = 65536
+
+
+def make_retriever(backend, vector_db, dtype="float32"):
+    """백엔드 선택: "chroma" (기존) / "numpy" (컬렉션 임베딩을 메모리 행렬로)"""
+    if backend == "chroma":
+        return ChromaRetriever(vector_db)
+    if backend == "numpy":
+        return NumpyFlatIndex.from_chroma(vector_db, dtype=dtype)
+    raise ValueError(f"알 수 없는 검색 백엔드: {backend} (chroma | numpy)")
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+class ChromaRetriever:
+    def __init__(self, vector_db):
+        self.vector_db = vector_db
+        space = (vector_db._collection.metadata or {}).get("hnsw:space", "l2")
+        self.cosine_distance = space == "cosine"
+
+    def __len__(self):
+        return self.vector_db._collection.count()
+
+    def search(self, vector, k=5, where=None):
+        return self.vector_db.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=where)
+
+    def search_batch(self, vectors, k=5, where=None):
+        wheres = where if isinstance(where, list) else [where] * len(vectors)
+        return [self.search(v, k, w) for v, w in zip(vectors, wheres)]
+
+    def get_by_ids(self, ids):
+        return self.vector_db.get_by_ids(ids)
+
+    def metadatas(self):
+        return self.vector_db.get(include=["metadatas"])["metadatas"]
+
+    def refresh(self, ids):
+        pass  # 컬렉션이 곧 색인
+
+    def update_metadatas(self, ids, metadatas):
+        pass  # 컬렉션이 곧 색인
+
+
+class NumpyFlatIndex:
+    def __init__(self, matrix, ids, metadatas, documents=None, doc_loader=None, source=None):
+        """
+        matrix: (N, dim) 행 정규화된 임베딩 (float32/float16, np.memmap 가능)
+        documents: 본문 목록 — 또는 doc_loader(i) → 본문 (스냅샷처럼 본문을 따로 들고 있을 때)
+        source: 새 문서를 가져올 Chroma (refresh용, 없으면 읽기 전용)
+        """
+        self.matrix = matrix
+        self.ids = list(ids)
+        self._metadatas = [m or {} for m in metadatas]
+        self._documents = documents
+        self._doc_loader = doc_loader
+        self._source = source
+        self._pos = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.columns = MetadataColumns.from_metadatas(self._metadatas)
+        self.cosine_distance = True
+
+    @classmethod
+    def from_chroma(cls, vector_db, dtype="float32"):
+        data = vector_db.get(include=["embeddings", "documents", "metadatas"])
+        dim = len(data["embeddings"][0]) if len(data["ids"]) else 0
+        matrix = _normalize(data["embeddings"]).astype(dtype) if len(data["ids"]) else np.zeros((0, dim), dtype=dtype)
+        return cls(matrix, data["ids"], data["metadatas"], documents=list(data["documents"]), source=vector_db)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- [문서] ---
+
+    def _document(self, i):
+        text = self._doc_loader(i) if self._doc_loader else self._documents[i]
+        return Document(id=self.ids[i], page_content=text, metadata=self._metadatas[i])
+
+    def get_by_ids(self, ids):
+        return [self._document(self._pos[i]) for i in ids if i in self._pos]
+
+    def metadatas(self):
+        return self._metadatas
+
+    def refresh(self, ids):
+        """컬렉션에 새로 들어간 문서의 저장된 임베딩을 행렬 끝에 붙임"""
+        ids = [i for i in ids if i not in self._pos]
+        if not ids:
+            return
+        if self._source is None or self._documents is None:
+            raise RuntimeError("읽기 전용 인덱스에는 문서를 추가할 수 없습니다.")
+        data = self._source.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        if not len(data["ids"]):
+            return
+        added = _normalize(data["embeddings"]).astype(self.matrix.dtype)
+        self.matrix = np.vstack([self.matrix, added]) if len(self.matrix) else added
+        for doc_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"]):
+            self._pos[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+            self._documents.append(text)
+            self._metadatas.append(meta or {})
+        self.columns = MetadataColumns.from_metadatas(self._metadatas)
+
+    def update_metadatas(self, ids, metadatas):
+        """컬렉션에서 메타데이터만 바뀐 문서 반영 (임베딩은 그대로)"""
+        for doc_id, meta in zip(ids, metadatas):
+            if doc_id in self._pos:
+                self._metadatas[self._pos[doc_id]] = meta
+        self.columns = MetadataColumns.from_metadatas(self._metadatas)
+
+    # --- [검색] ---
+
+    def _scores(self, queries):
+        """(Q, N) 코사인 유사도. float16 행렬은 청크 단위로 float32로 올려서 곱함"""
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), SEARCH_CHUNK_ROWS):
+            block = np.asarray(self.matrix[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def search_batch(self, vectors, k=5, where=None):
+        """여러 질문을 행렬 곱 한 번으로 채점. where: 공통 필터 하나 또는 질문별 필터 목록"""
+        if not len(vectors):
+            return []
+        if not self.ids:
+            return [[] for _ in vectors]
+        queries = _normalize(vectors)
+        scores = self._scores(queries)
+
+        wheres = where if isinstance(where, list) else [where] * len(queries)
+        masks = {}
+        results = []
+        for row, w in zip(scores, wheres):
+            # 같은 필터의 마스크는 한 번만 계산
+            key = repr(w)
+            if key not in masks:
+                masks[key] = self.columns.mask(w)
+            mask = masks[key]
+            if mask is not None:
+                row[~mask] = -np.inf
+            kk = min(k, len(row) if mask is None else int(mask.sum()))
+            if kk <= 0:
+                results.append([])
+                continue
+            top = np.argpartition(-row, kk - 1)[:kk]
+            top = top[np.argsort(-row[top])]
+            results.append([(self._document(i), float(1.0 - row[i])) for i in top])
+        return results
+
+    def search(self, vector, k=5, where=None):
+        """코사인 거리 상위 k개 [(Document, distance)]"""
+        return self.search_batch([vector], k, where)[0]
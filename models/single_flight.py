@@ -0,0 +1,104 @@
+"""
+single_flight.py — 같은 질문 동시 요청 합치기 (single-flight + 토큰 팬아웃)
+
+[역할]
+  시장 이슈가 터지면 수십 명이 몇 초 안에 같은 질문을 보내고, 각자 retrieve → grade → generate와
+  Gemini 스트림을 따로 돌린다. 정규화한 질문이 같은 요청이 이미 실행 중이면 새로 실행하지 않고
+  그 실행에 붙어 같은 토큰 스트림을 받는다.
+
+[동작]
+  - 첫 요청이 실행(producer 태스크)을 시작하고, 나오는 토큰을 버퍼에 쌓으면서 구독자들을 깨움
+  - 나중에 붙은 구독자는 버퍼에 이미 쌓인 토큰부터 재생한 뒤 실시간 토큰을 이어서 받음
+  - 실행이 끝나면(성공/실패) 항목을 지우므로, 그 뒤의 같은 질문은 새 실행 (또는 답변 캐시 히트)
+  - 실행 중 예외는 모든 구독자에게 그대로 전달
+  - 구독자가 모두 떠나면(클라이언트 연결 끊김) 실행 태스크를 취소
+
+[주요 클래스]
+  - SingleFlight: run(key, factory) → 토큰 async generator / in_flight(key) / stats()
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG.query_stream
+  - main.py → 이미 실행 중인 질문은 대기열 검사(429) 없이 합류
+"""
+import asyncio
+import logging
+
+log = logging.getLogger("stock_agent.rag")
+
+
+class _Flight:
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.updated = asyncio.Event()
+        self.task = None
+
+    def notify(self):
+        # 기다리던 구독자를 모두 깨우고 다음 대기용 이벤트로 교체
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}   # (이벤트 루프, key) → _Flight
+        self.counters = {"flights": 0, "coalesced": 0, "cancelled": 0}
+
+    def in_flight(self, key):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return (loop, key) in self._flights
+
+    def stats(self):
+        return {"in_flight": len(self._flights), **self.counters}
+
+    async def _produce(self, flight_key, flight, factory):
+        try:
+            async for token in factory():
+                flight.tokens.append(token)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._flights.pop(flight_key, None)
+            flight.notify()
+
+    async def run(self, key, factory):
+        """key가 같은 실행이 진행 중이면 합류, 아니면 factory()로 새 실행을 시작. 토큰을 차례로 yield"""
+        flight_key = (asyncio.get_running_loop(), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[flight_key] = flight
+            flight.task = asyncio.create_task(self._produce(flight_key, flight, factory))
+            self.counters["flights"] += 1
+        else:
+            self.counters["coalesced"] += 1
+            log.debug(f"🔗 [SingleFlight] 실행 중인 같은 질문에 합류 (버퍼 {len(flight.tokens)}토큰 재생)")
+
+        flight.subscribers += 1
+        try:
+            i = 0
+            while True:
+                if i < len(flight.tokens):
+                    yield flight.tokens[i]
+                    i += 1
+                elif flight.done:
+                    break
+                else:
+                    await flight.updated.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # 받을 사람이 없는 실행은 계속할 이유가 없음
+                self.counters["cancelled"] += 1
+                flight.task.cancel()
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
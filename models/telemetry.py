@@ -0,0 +1,218 @@
+"""
+telemetry.py — 단계별 지연 span, 히스토그램/카운터, Prometheus /metrics, 요청별 JSON 로그
+
+[역할]
+  노드마다 찍던 이모지 print는 부하 시 stdout에서 직렬화되고 집계도 안 된다.
+  대신 단계(span) 시간을 히스토그램에, 요청 수·재검색·판정·LLM 토큰을 카운터에 쌓고
+  Prometheus 텍스트 형식으로 내보낸다. (prometheus_client 없이 동작하는 최소 구현)
+
+[구성]
+  - Counter / Histogram: 라벨별 값, 스레드 안전 (동기 노드는 스레드 풀에서 실행되므로)
+      Counter.totals(label)로 다른 모듈의 stats() dict도 같은 카운터로 집계
+  - Telemetry.span(stage): with 블록 시간 → stage_seconds{stage=...} + 현재 요청 trace에 기록
+  - Telemetry.new_trace / bind / finish: 요청 단위 trace (contextvars로 노드까지 전달)
+      finish 시 JSON 로그 한 줄 (LOG_JSON=1일 때만, logger "stock_agent.request")
+  - LOG_LEVEL=DEBUG 등을 주면 노드 진행 로그(logger "stock_agent.rag")도 출력
+  - Telemetry.add_collector(fn): 다른 모듈의 stats()를 /metrics에 게이지로 함께 노출
+  - render(): Prometheus 텍스트 노출 형식
+
+[참조하는 곳]
+  - finance_rag.py → 임베딩/검색/노드/첫 토큰/전체 스트림 span, 카운터
+  - main.py → GET /metrics, X-Request-ID
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# 요청 처리 단계는 수 ms ~ 수십 초 범위
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+request_log = logging.getLogger("stock_agent.request")
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    body = ",".join(f'{k}="{escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def totals(self, label, keys=()):
+        """라벨 하나 기준 {라벨 값: 누적값} (stats() dict용, keys는 아직 안 쌓였어도 0으로 넣을 항목)"""
+        totals = dict.fromkeys(keys, 0)
+        with self._lock:
+            for key, value in self._values.items():
+                name = dict(key).get(label)
+                if name is not None:
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels → [bucket 누적 카운트..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    out.append((f"{self.name}_bucket", key + (("le", f"{bound:g}"),), count))
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series[-1]))
+                out.append((f"{self.name}_sum", key, round(series[-2], 6)))
+                out.append((f"{self.name}_count", key, series[-1]))
+        return out
+
+
+class Telemetry:
+    def __init__(self, namespace="stock_agent", log_json=None):
+        self.namespace = namespace
+        self._metrics = {}
+        self._collectors = []
+        self.log_json = os.getenv("LOG_JSON", "0") == "1" if log_json is None else log_json
+        if os.getenv("LOG_LEVEL"):
+            logging.basicConfig(level=os.getenv("LOG_LEVEL").upper(), format="%(message)s")
+        if self.log_json and not request_log.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            request_log.addHandler(handler)
+            request_log.setLevel(logging.INFO)
+            request_log.propagate = False
+
+        self.stage_seconds = self.histogram("stage_seconds", "단계별 소요 시간 (embed, vector_search, node_* 등)")
+        self.ttft_seconds = self.histogram("first_token_seconds", "요청 시작 → 첫 토큰")
+        self.stream_seconds = self.histogram("stream_seconds", "요청 시작 → 스트림 종료")
+        self.requests = self.counter("requests_total", "요청 수 (outcome별)")
+        self.rewrites = self.counter("rewrites_total", "rewrite 엣지를 통한 재검색 수")
+        self.grades = self.counter("grade_total", "적합성 판정 수 (verdict, path별)")
+        self.llm_tokens = self.counter("llm_tokens_total", "LLM 토큰 수 (kind=input|output)")
+
+    # --- [등록] ---
+
+    def counter(self, name, help_text):
+        return self._metrics.setdefault(name, Counter(f"{self.namespace}_{name}", help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(f"{self.namespace}_{name}", help_text, buckets))
+
+    def add_collector(self, prefix, fn):
+        """fn() → {이름: 숫자 또는 {하위이름: 숫자}} (예: answer_cache.stats). 게이지로 노출"""
+        self._collectors.append((prefix, fn))
+
+    # --- [span / 요청 trace] ---
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds.observe(elapsed, stage=stage)
+            trace = _current_trace.get()
+            if trace is not None:
+                spans = trace["spans"]
+                spans[stage] = round(spans.get(stage, 0.0) + elapsed, 6)
+
+    def annotate(self, **fields):
+        """현재 요청 trace에 필드 기록 (outcome, route, retries 등)"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.update(fields)
+
+    @staticmethod
+    def new_trace(question, request_id=None):
+        return {"request_id": request_id or uuid.uuid4().hex[:16], "question": question,
+                "start": time.perf_counter(), "spans": {}, "outcome": None, "tokens": 0}
+
+    @staticmethod
+    def bind(trace):
+        """현재 태스크(와 여기서 파생되는 노드 태스크/스레드)의 span을 trace에 기록하도록 연결"""
+        _current_trace.set(trace)
+
+    def first_token(self, trace):
+        if "first_token_s" not in trace:
+            trace["first_token_s"] = round(time.perf_counter() - trace["start"], 6)
+            self.ttft_seconds.observe(trace["first_token_s"])
+
+    def finish(self, trace):
+        trace["total_s"] = round(time.perf_counter() - trace["start"], 6)
+        outcome = trace["outcome"] or "cancelled"
+        self.stream_seconds.observe(trace["total_s"], outcome=outcome)
+        self.requests.inc(outcome=outcome)
+        if self.log_json:
+            record = {k: v for k, v in trace.items() if k != "start"}
+            record["outcome"] = outcome
+            request_log.info(json.dumps(record, ensure_ascii=False))
+
+    # --- [노출] ---
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_str(labels)} {value}")
+
+        for prefix, fn in self._collectors:
+            try:
+                stats = fn()
+            except Exception:
+                continue
+            for key, value in self._flatten(stats):
+                name = f"{self.namespace}_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _flatten(stats, prefix=""):
+        for key, value in stats.items():
+            key = f"{prefix}{key}"
+            if isinstance(value, dict):
+                yield from Telemetry._flatten(value, f"{key}_")
+            elif isinstance(value, (int, float)):
+                yield key, value
@@ -0,0 +1,140 @@
+"""
+vector_snapshot.py — 벡터 컬렉션 읽기 전용 스냅샷 (mmap 공유, 멀티 워커용)
+
+[역할]
+  uvicorn 워커를 여러 개 띄우면 워커마다 Chroma 클라이언트와 컬렉션 사본을 따로 들고 있어
+  RSS와 기동 시간이 워커 수만큼 늘어난다. finance_local_db 컬렉션을 불변 스냅샷 파일로 내보내고,
+  각 워커는 이를 mmap으로 열어 OS 페이지 캐시를 통해 같은 물리 페이지를 공유한다.
+
+[스냅샷 구조] (out_dir/)
+  - embeddings.npy   : (N, dim) 정규화된 임베딩 행렬 (float16 또는 float32) → np.load(mmap_mode="r")
+  - documents.bin    : 문서 본문 UTF-8 연결 바이트 → mmap, doc_offsets.npy로 슬라이스
+  - doc_offsets.npy  : (N+1,) int64 본문 시작 위치
+  - ids.json         : 문서 ID 목록
+  - metadatas.jsonl  : 문서별 메타데이터 (company, fiscal_year, source)
+  - lexical_index.pkl: 같은 문서로 만든 BM25 역색인 (lexical_index.py)
+  - manifest.json    : 건수, dtype, 생성 시각, 원본 경로
+  스냅샷은 임시 폴더에 다 쓴 뒤 rename으로 교체되므로, 읽는 쪽은 항상 완결된 파일만 본다.
+
+[주요 클래스/함수]
+  - export_snapshot(db_dir, out_dir, dtype): Chroma 컬렉션 → 스냅샷
+  - VectorSnapshot.open(dir): mmap으로 열기 → .index (retrievers.NumpyFlatIndex, 읽기 전용)
+
+[사용법]
+  cd models
+  python vector_snapshot.py --db ./finance_local_db --out ./finance_snapshot --dtype float16
+  VECTOR_SNAPSHOT_DIR=./finance_snapshot uvicorn main:app --workers 4
+
+[참조하는 곳]
+  - finance_rag.py → FinanceRAG(snapshot_dir=...)
+"""
+import os
+import json
+import mmap
+import time
+import shutil
+import argparse
+
+import numpy as np
+from langchain_core.documents import Document
+
+from lexical_index import NgramBM25Index
+from retrievers import NumpyFlatIndex
+
+
+def export_snapshot(db_dir, out_dir, dtype="float16", page_size=5000):
+    """Chroma 컬렉션을 스냅샷으로 내보냄 (임베딩 모델 없이 저장된 벡터를 그대로 읽음)"""
+    from langchain_chroma import Chroma
+
+    collection = Chroma(persist_directory=db_dir)._collection
+    total = collection.count()
+    if total == 0:
+        raise ValueError(f"빈 컬렉션입니다: {db_dir}")
+
+    tmp_dir = out_dir.rstrip("/") + f".tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    ids, offsets, matrix = [], [0], None
+    lexical = NgramBM25Index()
+    with open(os.path.join(tmp_dir, "documents.bin"), "wb") as doc_f, \
+         open(os.path.join(tmp_dir, "metadatas.jsonl"), "w", encoding="utf-8") as meta_f:
+        for start in range(0, total, page_size):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=start)
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    os.path.join(tmp_dir, "embeddings.npy"), mode="w+", dtype=dtype, shape=(total, vectors.shape[1])
+                )
+            matrix[start:start + len(vectors)] = vectors.astype(dtype)
+
+            for doc_id, text, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                encoded = (text or "").encode("utf-8")
+                doc_f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+                meta_f.write(json.dumps(meta or {}, ensure_ascii=False) + "\n")
+                ids.append(doc_id)
+            lexical.add(page["ids"], [Document(page_content=t or "", metadata=m or {})
+                                      for t, m in zip(page["documents"], page["metadatas"])])
+            print(f"📤 [Snapshot] {len(ids):,} / {total:,}")
+
+    matrix.flush()
+    del matrix
+    lexical.save(os.path.join(tmp_dir, "lexical_index.pkl"))
+    np.save(os.path.join(tmp_dir, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": len(ids), "dtype": dtype, "normalized": True,
+            "source": os.path.abspath(db_dir), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, ensure_ascii=False, indent=2)
+
+    # 완성된 스냅샷으로 한 번에 교체
+    old_dir = out_dir.rstrip("/") + ".old"
+    if os.path.exists(out_dir):
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"✅ [Snapshot] {len(ids):,}건 → {out_dir} ({dtype})")
+
+
+class VectorSnapshot:
+    def __init__(self, snapshot_dir):
+        with open(os.path.join(snapshot_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(snapshot_dir, "ids.json"), encoding="utf-8") as f:
+            self.ids = json.load(f)
+        with open(os.path.join(snapshot_dir, "metadatas.jsonl"), encoding="utf-8") as f:
+            self.metadatas = [json.loads(line) for line in f]
+
+        # 큰 파일은 mmap: 워커끼리 OS 페이지 캐시를 공유
+        self.embeddings = np.load(os.path.join(snapshot_dir, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(snapshot_dir, "doc_offsets.npy"), mmap_mode="r")
+        self._doc_file = open(os.path.join(snapshot_dir, "documents.bin"), "rb")
+        self._docs = mmap.mmap(self._doc_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(self._doc_file.name) else b""
+
+        # 검색은 mmap 행렬 위의 NumpyFlatIndex (본문은 필요한 문서만 documents.bin에서 잘라 읽음)
+        self.index = NumpyFlatIndex(self.embeddings, self.ids, self.metadatas, doc_loader=self._text)
+
+    @classmethod
+    def open(cls, snapshot_dir):
+        return cls(snapshot_dir)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _text(self, i):
+        return self._docs[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chroma 컬렉션 → mmap 스냅샷 내보내기")
+    parser.add_argument("--db", default="./finance_local_db")
+    parser.add_argument("--out", default="./finance_snapshot")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    args = parser.parse_args()
+    export_snapshot(args.db, args.out, args.dtype)